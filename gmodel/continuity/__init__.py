@@ -0,0 +1,11 @@
+from ._experimental import Experimental
+from ._theoretical import Theoretical
+
+from ._variogram import Variogram
+from ._gridvariogram import GridVariogram
+from ._accumulator import Accumulator
+from ._pairindex import PairIndex
+from ._fitting import Fitting
+from ._nested import Structure
+from ._nested import Nested
+from ._lookup import Lookup
@@ -0,0 +1,112 @@
+import numpy
+
+from ._binning import Binning
+from ._pairs import Pairs
+
+from ._experimental import Experimental
+
+from ._variogram import Variogram
+
+class Accumulator():
+    """Persistent per-lag sums and pair counts of experimental variograms that
+    are updated in place when samples are appended or removed. Only the pairs
+    involving the changed samples are computed."""
+
+    def __init__(self,exps:tuple[Experimental],points=None,prop=None):
+        """
+        exps    : Experimental instance or tuple of them sharing lagdist,
+                  lagtol and outbound, one variogram is kept per direction
+        points  : (optional) (n,d) coordinates of the initial samples
+        prop    : (optional) (n,) property values of the initial samples
+        """
+        self._exps = (exps,) if isinstance(exps,Experimental) else tuple(exps)
+
+        Variogram._check(self._exps)
+
+        self._hbins = Variogram.bins(self._exps[0])
+
+        self._sums = numpy.zeros((len(self._exps),self._hbins.size))
+        self._nums = numpy.zeros((len(self._exps),self._hbins.size))
+
+        self._points = None
+        self._prop = numpy.empty(0)
+
+        self._active = numpy.empty(0,dtype=bool)
+
+        if prop is not None:
+            self.append(points,prop)
+
+    def append(self,points,prop):
+        """Adds the samples and returns their indices, which identify them for removal."""
+
+        prop = numpy.ravel(prop).astype(float)
+
+        points = numpy.asarray(points,dtype=float).reshape((prop.size,-1))
+
+        index = numpy.arange(self._prop.size,self._prop.size+prop.size)
+
+        existing = numpy.flatnonzero(self._active)
+
+        self._points = points if self._points is None else numpy.concatenate((self._points,points))
+        self._prop = numpy.concatenate((self._prop,prop))
+
+        self._active = numpy.concatenate((self._active,numpy.ones(prop.size,dtype=bool)))
+
+        self._update(index,existing,1.)
+        self._update(index,index,1.)
+
+        return index
+
+    def remove(self,index):
+        """Removes the samples at index, e.g. the samples of a well for a sensitivity check."""
+
+        index = numpy.ravel(index)
+
+        index = numpy.unique(index[self._active[index]])
+
+        self._active[index] = False
+
+        self._update(index,numpy.flatnonzero(self._active),-1.)
+        self._update(index,index,-1.)
+
+    def _update(self,rows,cols,sign):
+        """Adds (sign=1) or subtracts (sign=-1) the contributions of the pairs between rows and cols."""
+
+        if rows.size==0 or cols.size==0:
+            return
+
+        exp = self._exps[0]
+
+        blocks = Pairs.cross(self._points,rows,cols,self._hbins[-1]+exp.lagtol)
+
+        for first,second,distance,lags,weights in Variogram._pointblocks(self._points,self._exps,self._hbins,blocks):
+
+            sums,nums = Binning.reduce(lags,(self._prop[second]-self._prop[first])**2,self._hbins.size,weights)
+
+            self._sums += sign*sums
+            self._nums += sign*nums
+
+        # removals may leave round-off residues behind in empty lags
+        self._sums[self._nums==0] = 0.
+
+    @property
+    def gamma(self):
+        """Returns the semivariances, shape is (nlags,) for a single direction
+        and (ndir,nlags) for several directions."""
+        gamma = Binning.semivariance(self._sums,self._nums)
+        return gamma[0] if len(self._exps)==1 else gamma
+
+    @property
+    def nums(self):
+        """Returns the pair counts with the shape of gamma."""
+        return self._nums[0] if len(self._exps)==1 else self._nums
+
+    @property
+    def bins(self):
+        """Returns the lag centers."""
+        return self._hbins
+
+    @property
+    def size(self):
+        """Returns the number of active samples."""
+        return int(self._active.sum())
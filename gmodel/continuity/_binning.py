@@ -0,0 +1,147 @@
+import numpy
+
+class Binning():
+    """Assigns pairs to lag classes in a single sweep and accumulates
+    the per-lag sums with bincount reductions."""
+
+    @staticmethod
+    def classes(distance,hbins,lagdist,lagtol):
+        """Returns the pair positions and the lag indices they belong to.
+
+        distance : flat array of pair separation distances
+        hbins    : lag centers, hbins[k] = lagdist*(k+1)
+        lagdist  : lag separation distance
+        lagtol   : lag tolerance, a pair belongs to the lag k if
+                   abs(distance-hbins[k])<=lagtol
+
+        When lagtol exceeds lagdist/2, the lag classes overlap and a pair
+        may be counted in several lags; positions are repeated in that case.
+        """
+        distance = numpy.ravel(distance)
+
+        nlags = hbins.size
+
+        index = numpy.rint(distance/lagdist).astype(numpy.intp)-1
+
+        numpy.clip(index,0,nlags-1,out=index)
+
+        residue = distance-hbins[index]
+
+        valid = numpy.abs(residue)<=lagtol
+
+        pairs = [numpy.flatnonzero(valid)]
+        lags = [index[valid]]
+
+        reach = int(numpy.floor(lagtol/lagdist+0.5))
+
+        if reach==0:
+            return pairs[0],lags[0]
+
+        # only pairs far enough from their nearest lag center can reach a neighbour,
+        # the lower limit is relaxed slightly against round-off at exact ties
+        residue = numpy.abs(residue)
+
+        spill = numpy.flatnonzero(numpy.logical_and(
+            residue>=(lagdist-lagtol)-1e-9*lagdist,residue<=reach*lagdist+lagtol))
+
+        for offset in range(-reach,reach+1):
+
+            if offset==0:
+                continue
+
+            shifted = index[spill]+offset
+
+            inside = numpy.logical_and(shifted>=0,shifted<nlags)
+
+            candidate,shifted = spill[inside],shifted[inside]
+
+            valid = numpy.abs(distance[candidate]-hbins[shifted])<=lagtol
+
+            pairs.append(candidate[valid])
+            lags.append(shifted[valid])
+
+        return numpy.concatenate(pairs),numpy.concatenate(lags)
+
+    @staticmethod
+    def accumulate(distance,value,hbins,lagdist,lagtol,weights=None):
+        """Returns the per-lag sums of value and the per-lag pair counts.
+
+        weights : (optional) multiplicity of each pair, e.g. the number of
+                  pair orientations falling inside the search direction;
+                  a (ndir,npairs) array gives (ndir,nlags) results, the
+                  last axis must run over the flat distance array
+        """
+        pairs,lags = Binning.classes(distance,hbins,lagdist,lagtol)
+
+        if weights is not None:
+            weights = numpy.asarray(weights)[...,pairs]
+
+        return Binning.reduce(lags,numpy.ravel(value)[pairs],hbins.size,weights)
+
+    @staticmethod
+    def reduce(lags,value,nlags,weights=None):
+        """Returns the per-lag sums of value and the per-lag pair counts for
+        the pairs already assigned to the lags.
+
+        value   : pair values, shape (...,npairs) reduces every leading row
+        weights : (optional) pair multiplicities broadcasting against value,
+                  e.g. (ndir,1,npairs) for several directions and properties;
+                  all rows are reduced in one bincount
+        """
+        if weights is None:
+            return Binning.bincount(lags,value,nlags),numpy.bincount(lags,minlength=nlags)
+
+        return Binning.bincount(lags,weights*value,nlags),Binning.bincount(lags,weights,nlags)
+
+    @staticmethod
+    def bincount(lags,weights,nlags):
+        """Returns the per-lag sums of weights with shape (...,nlags)."""
+
+        weights = numpy.asarray(weights)
+
+        shape = weights.shape[:-1]
+        nrows = int(numpy.prod(shape))
+
+        index = (lags+nlags*numpy.arange(nrows).reshape((-1,1))).ravel()
+
+        sums = numpy.bincount(index,weights=weights.reshape((nrows,lags.size)).ravel(),minlength=nrows*nlags)
+
+        return sums.reshape(shape+(nlags,))
+
+    @staticmethod
+    def semivariance(sums,nums):
+        """Returns the semivariance from squared difference sums and pair counts,
+        lags without any pair are set to nan."""
+
+        gamma = numpy.full(sums.shape,numpy.nan)
+
+        numpy.divide(sums,2*nums,out=gamma,where=nums>0)
+
+        return gamma
+
+    @staticmethod
+    def median(hist,width):
+        """Returns the medians interpolated from the histogram rows, hist shape is
+        (nlags,nbins) with bins of the given width starting at zero; rows
+        without any count are set to nan."""
+
+        total = hist.sum(axis=1)
+
+        cumsum = numpy.cumsum(hist,axis=1)
+
+        half = (total/2).reshape((-1,1))
+
+        index = numpy.minimum((cumsum<half).sum(axis=1),hist.shape[1]-1)
+
+        rows = numpy.arange(hist.shape[0])
+
+        count = hist[rows,index]
+
+        before = cumsum[rows,index]-count
+
+        with numpy.errstate(divide='ignore',invalid='ignore'):
+            median = (index+numpy.where(count>0,(half[:,0]-before)/count,0.))*width
+
+        median[total==0] = numpy.nan
+
+        return median
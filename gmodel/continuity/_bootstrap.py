@@ -0,0 +1,91 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from ._binning import Binning
+
+_geometry = None # pair geometry shared by the worker processes
+
+class Resample():
+    """Resamples the samples of a fixed pair geometry for variogram uncertainty.
+
+    A replicate is described by the multiplicity of each sample, so a pair
+    (i,j) enters the replicate counts[i]*counts[j] times and the geometry
+    (pairs, lags, direction weights, squared differences) is never rebuilt.
+    """
+
+    @staticmethod
+    def groups(points,cellsize):
+        """Returns the spatial block label of each sample for blocks of cellsize."""
+
+        cells = numpy.floor((points-points.min(axis=0))/cellsize).astype(numpy.int64)
+
+        return numpy.unique(cells,axis=0,return_inverse=True)[1].ravel()
+
+    @staticmethod
+    def bootstrap(size,replicates,groups=None,seed=None):
+        """Returns (replicates,size) sample multiplicities drawn with replacement,
+        whole groups are drawn together when the group labels are given."""
+
+        generator = numpy.random.default_rng(seed)
+
+        if groups is None:
+            return generator.multinomial(size,numpy.full(size,1/size),replicates)
+
+        labels,inverse = numpy.unique(groups,return_inverse=True)
+
+        drawn = generator.multinomial(labels.size,numpy.full(labels.size,1/labels.size),replicates)
+
+        return drawn[:,inverse.ravel()]
+
+    @staticmethod
+    def jackknife(size,groups=None):
+        """Returns (ngroups,size) sample multiplicities leaving one sample, or one
+        group when the group labels are given, out at a time."""
+
+        groups = numpy.arange(size) if groups is None else numpy.asarray(groups)
+
+        labels = numpy.unique(groups)
+
+        return (groups!=labels.reshape((-1,1))).astype(int)
+
+    @staticmethod
+    def gamma(counts,geometry):
+        """Returns (replicates,nlags) semivariances of the replicates.
+
+        geometry : (first,second,lags,weights,value,nlags) of the pairs
+        """
+        first,second,lags,weights,value,nlags = geometry
+
+        multiple = counts[:,first]*counts[:,second]*weights
+
+        sums = Binning.bincount(lags,multiple*value,nlags)
+        nums = Binning.bincount(lags,multiple,nlags)
+
+        return Binning.semivariance(sums,nums)
+
+    @staticmethod
+    def run(counts,geometry,workers:int=None,chunksize:int=16):
+        """Returns the replicate semivariances computed in chunks of replicates
+        over a process pool; the geometry is sent once to every worker."""
+
+        workers = os.cpu_count() if workers is None else workers
+
+        chunks = [counts[start:start+chunksize] for start in range(0,counts.shape[0],chunksize)]
+
+        if workers==1 or len(chunks)==1:
+            return numpy.concatenate([Resample.gamma(chunk,geometry) for chunk in chunks])
+
+        with ProcessPoolExecutor(workers,initializer=Resample._share,initargs=(geometry,)) as pool:
+            return numpy.concatenate(list(pool.map(Resample._task,chunks)))
+
+    @staticmethod
+    def _share(geometry):
+        global _geometry
+        _geometry = geometry
+
+    @staticmethod
+    def _task(counts):
+        return Resample.gamma(counts,_geometry)
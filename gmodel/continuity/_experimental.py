@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+import numpy
+
 @dataclass(frozen=True)
 class Experimental:
     """It is a variogram property dictionary."""
@@ -7,8 +9,11 @@ class Experimental:
     lagtol      : float = None
     outbound    : float = None
     azimuth     : float = 0.0
-    azimtol     : float = numpy.pi
+    azimtol     : float = 90.0
     bdwidth     : float = numpy.inf
+    dip         : float = 0.0
+    diptol      : float = 90.0
+    vbdwidth    : float = numpy.inf
 
     @property
     def params(self):
@@ -23,5 +28,26 @@ class Experimental:
         return {
             "azimuth"   : numpy.radians(self.azimuth),
             "azimtol"   : numpy.radians(self.azimtol),
-            "bdwidth"   : self.bdwidth
-            }
\ No newline at end of file
+            "bdwidth"   : self.bdwidth,
+            "dip"       : numpy.radians(self.dip),
+            "diptol"    : numpy.radians(self.diptol),
+            "vbdwidth"  : self.vbdwidth
+            }
+
+    @property
+    def rotation(self):
+        """Returns the rotation matrix whose rows are the unit vectors along the
+        search direction, across it in the horizontal plane and across it in
+        the vertical plane. The dip is measured from the horizontal plane and
+        is positive towards +z."""
+
+        params = self.anisoparams
+
+        cosazim,sinazim = numpy.cos(params["azimuth"]),numpy.sin(params["azimuth"])
+        cosdip,sindip = numpy.cos(params["dip"]),numpy.sin(params["dip"])
+
+        return numpy.array([
+            [cosdip*cosazim,cosdip*sinazim,sindip],
+            [-sinazim,cosazim,0.],
+            [-sindip*cosazim,-sindip*sinazim,cosdip],
+            ])
\ No newline at end of file
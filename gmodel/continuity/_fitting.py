@@ -0,0 +1,142 @@
+import numpy
+
+from ._theoretical import Theoretical
+
+class Fitting():
+    """Weighted least-squares fits of the Theoretical models to experimental variograms.
+
+    For a fixed radius, or power exponent, every model is linear in the nugget
+    and in the sill contribution, so both are solved in closed form for a whole
+    batch of radii at once. The radius batch is a broadcast (nparams,nlags)
+    array of model values; the best radius of a batch is refined by a finer
+    batch around it.
+    """
+
+    models = ("spherical","exponential","gaussian","cubic","cauchy","holeeffect","powermodel","dewijs")
+
+    @staticmethod
+    def fit(gamma,bins,nums=None,models:tuple[str]=None,size:int=64,refine:int=2):
+        """Returns list of (Theoretical,misfit) tuples sorted by the misfit, the
+        weighted mean squared residual of the fit.
+
+        gamma   : experimental semivariances, nan lags are skipped
+        bins    : lag distances
+        nums    : (optional) pair counts used as weights, equal weights if None
+        models  : (optional) names of the models to fit, defaults to all
+        size    : number of radii (or power exponents) evaluated per batch
+        refine  : number of refining batches after the initial one
+        """
+        gamma = numpy.asarray(gamma,dtype=float)
+        bins = numpy.asarray(bins,dtype=float)
+
+        weights = numpy.ones(bins.shape) if nums is None else numpy.asarray(nums,dtype=float)
+
+        valid = numpy.isfinite(gamma)&(weights>0)&(bins>0)
+
+        if valid.sum()<2:
+            raise ValueError("At least two lags with pairs are needed to fit a model.")
+
+        gamma,bins,weights = gamma[valid],bins[valid],weights[valid]
+
+        models = Fitting.models if models is None else models
+
+        results = [Fitting.model(model,gamma,bins,weights,size,refine) for model in models]
+
+        return sorted(results,key=lambda result:result[1])
+
+    @staticmethod
+    def model(model:str,gamma,bins,weights,size:int=64,refine:int=2):
+        """Returns the best (Theoretical,misfit) of a single model."""
+
+        params = Fitting.grid(model,bins,size)
+
+        for step in range(refine+1):
+
+            nugget,contrib,sse = Fitting.solve(Fitting.basis(model,bins,params),gamma,weights)
+
+            best = numpy.argmin(sse)
+
+            if params.size==1 or step==refine:
+                break
+
+            lower,upper = params[max(best-1,0)],params[min(best+1,params.size-1)]
+
+            params = numpy.linspace(lower,upper,size)
+
+        misfit = sse[best]/weights.sum()
+
+        nugget,sill = float(nugget[best]),float(nugget[best]+contrib[best])
+
+        if model=="powermodel":
+            return Theoretical(model,sill=sill,nugget=nugget,power=float(params[best])),misfit
+
+        if model=="dewijs":
+            return Theoretical(model,sill=sill,nugget=nugget),misfit
+
+        return Theoretical(model,sill=sill,radius=float(params[best]),nugget=nugget),misfit
+
+    @staticmethod
+    def grid(model:str,bins,size:int=64):
+        """Returns the initial batch of radii, or power exponents, of the model."""
+
+        if model=="dewijs":
+            return numpy.array([numpy.nan])
+
+        if model=="powermodel":
+            return numpy.linspace(0.05,1.95,size)
+
+        return numpy.geomspace(bins.min()/4,bins.max()*3,size)
+
+    @staticmethod
+    def basis(model:str,bins,params):
+        """Returns (nparams,nlags) unit-sill values of the model without nugget.
+
+        The radius models depend on the ratio of the lag to the radius only, so
+        they are evaluated with unit radius at the (nparams,nlags) ratios. The
+        power model with unit exponent is the identity, evaluated at bins**power.
+        """
+        params = params.reshape((-1,1))
+
+        if model=="dewijs":
+            return Theoretical(model,sill=1.)(bins.reshape((1,-1)))
+
+        if model=="powermodel":
+            return Theoretical(model,sill=1.)(bins**params)
+
+        return Theoretical(model,sill=1.,radius=1.)(bins/params)
+
+    @staticmethod
+    def solve(basis,gamma,weights):
+        """Returns the nonnegative nugget and sill contribution minimizing the weighted
+        squared residuals of nugget+contrib*basis for every row of the basis, along
+        with the weighted sums of squared residuals."""
+
+        S0 = weights.sum()
+        Sg = (weights*gamma).sum()
+
+        S1 = (weights*basis).sum(axis=1)
+        S2 = (weights*basis**2).sum(axis=1)
+        Sfg = (weights*basis*gamma).sum(axis=1)
+
+        with numpy.errstate(divide='ignore',invalid='ignore'):
+
+            det = S0*S2-S1**2
+
+            # unconstrained solution, and the two boundary solutions without
+            # nugget and without structure
+            nuggets = numpy.array([(S2*Sg-S1*Sfg)/det,numpy.zeros_like(S1),numpy.full_like(S1,Sg/S0)])
+            contribs = numpy.array([(S0*Sfg-S1*Sg)/det,numpy.maximum(Sfg/S2,0.),numpy.zeros_like(S1)])
+
+        feasible = numpy.isfinite(nuggets)&numpy.isfinite(contribs)&(nuggets>=0)&(contribs>=0)
+
+        nuggets,contribs = numpy.where(feasible,nuggets,0.),numpy.where(feasible,contribs,0.)
+
+        residual = gamma-nuggets[...,numpy.newaxis]-contribs[...,numpy.newaxis]*basis
+
+        errors = numpy.where(feasible,(weights*residual**2).sum(axis=-1),numpy.inf)
+
+        choice = numpy.argmin(errors,axis=0)
+
+        column = numpy.arange(choice.size)
+
+        return nuggets[choice,column],contribs[choice,column],errors[choice,column]
@@ -0,0 +1,142 @@
+import numpy
+
+from scipy import fft
+
+from ._binning import Binning
+
+from ._experimental import Experimental
+
+from ._variogram import Variogram
+
+class GridVariogram():
+    """FFT based experimental variogram maps of properties on regular grids.
+
+    The lag maps are arranged like the grid arrays: the last axis runs
+    along x, the one before along y and the third from last along z.
+    Lag index k of an axis with n cells sits at position k+n-1 of the map.
+    """
+
+    @staticmethod
+    def lagmap(prop,mask=None,ndim:int=None):
+        """Returns the variogram map and the pair count map of prop.
+
+        prop    : property array, the last ndim axes are the grid axes and
+                  any leading axes are treated as separate realizations
+        mask    : (optional) boolean array of active cells broadcasting to prop,
+                  nan values in prop are always treated as missing
+        ndim    : (optional) number of grid axes, defaults to prop.ndim
+
+        The returned gamma and nums have shape (...,2*n1-1,2*n2-1,...).
+        """
+        prop = numpy.asarray(prop,dtype=float)
+
+        ndim = prop.ndim if ndim is None else ndim
+
+        axes = tuple(range(prop.ndim-ndim,prop.ndim))
+        grid = prop.shape[prop.ndim-ndim:]
+
+        indicator = numpy.isfinite(prop)
+
+        if mask is not None:
+            indicator &= numpy.asarray(mask,dtype=bool)
+
+        value = numpy.where(indicator,prop,0.)
+
+        indicator = indicator.astype(float)
+
+        # zero padding to at least 2n-1 keeps the circular correlation free of wrap-around
+        shape = [fft.next_fast_len(2*size-1,real=True) for size in grid]
+
+        ispec = fft.rfftn(indicator,shape,axes=axes)
+        vspec = fft.rfftn(value,shape,axes=axes)
+        sspec = fft.rfftn(value**2,shape,axes=axes)
+
+        nums = fft.irfftn(ispec.conj()*ispec,shape,axes=axes)
+
+        # sum of (z(x+h)-z(x))**2 over active pairs expanded into correlations
+        sums = fft.irfftn(2*(ispec.conj()*sspec).real-2*(vspec.conj()*vspec).real,shape,axes=axes)
+
+        index = numpy.ix_(*[numpy.r_[length-size+1:length,0:size] for size,length in zip(grid,shape)])
+        index = (Ellipsis,)+index
+
+        nums = numpy.rint(nums[index])
+        sums = numpy.maximum(sums[index],0.)
+
+        return Binning.semivariance(sums,nums),nums
+
+    @staticmethod
+    def lags(shape,spacing):
+        """Returns the lag vector components of a map with the given grid shape,
+        each array has the map shape and is ordered as the map axes."""
+
+        axes = [numpy.arange(-size+1,size)*delta for size,delta in zip(shape,spacing)]
+
+        return numpy.meshgrid(*axes,indexing='ij')
+
+    @staticmethod
+    def grid(grid,prop,mask=None):
+        """Returns the variogram map, the pair count map and the cell spacing of a
+        property defined on the cells of GridDelta or GridRegular.
+
+        prop    : cell values in the grid index order (x fastest, then y and z),
+                  shape (ncells,) or (nreals,ncells) for several realizations
+        mask    : (optional) boolean array of active cells, shape (ncells,)
+
+        The spacing is returned as (zdelta,ydelta,xdelta) in feet.
+        """
+        spacing = []
+
+        for delta in (grid.zdelta,grid.ydelta,grid.xdelta):
+
+            if not numpy.allclose(delta,delta[0]):
+                raise ValueError("FFT variogram map requires uniform grid spacing.")
+
+            spacing.append(delta[0])
+
+        shape = (grid.znums,grid.ynums,grid.xnums)
+
+        prop = numpy.asarray(prop)
+
+        prop = prop.reshape(prop.shape[:-1]+shape)
+        mask = None if mask is None else numpy.reshape(mask,shape)
+
+        gamma,nums = GridVariogram.lagmap(prop,mask,ndim=3)
+
+        return gamma,nums,tuple(spacing)
+
+    @staticmethod
+    def directional(gamma,nums,spacing,exp:Experimental):
+        """Returns the directional experimental variogram from the lag map,
+        compatible with Variogram.bins. The map cells are binned as pairs
+        weighted by their counts, so the result equals the pairwise variogram.
+
+        spacing : cell sizes ordered as the map axes, i.e. (...,ydelta,xdelta)
+        """
+        shape = tuple((size+1)//2 for size in gamma.shape[-len(spacing):])
+
+        vector = GridVariogram.lags(shape,spacing)[::-1]
+
+        vector = numpy.array([component.ravel() for component in vector])
+
+        distance = numpy.sqrt((vector**2).sum(axis=0))
+
+        hbins = Variogram.bins(exp)
+
+        pairs,lags = Binning.classes(distance,hbins,exp.lagdist,exp.lagtol)
+
+        # the map holds both h and -h, halving the counts gives unordered pairs
+        # while the zero lag cell of self pairs is dropped
+        lags,pairs = lags[distance[pairs]>0],pairs[distance[pairs]>0]
+
+        rotation = exp.rotation[:,:vector.shape[0]]
+
+        mapsize = distance.size
+
+        counts = nums.reshape(nums.shape[:-len(spacing)]+(mapsize,))[...,pairs]/2.
+        counts = counts*Variogram.direction(rotation@vector[:,pairs],exp)
+
+        values = numpy.nan_to_num(2*gamma).reshape(counts.shape[:-1]+(mapsize,))[...,pairs]
+
+        sums,nums = Binning.reduce(lags,values,hbins.size,counts)
+
+        return Binning.semivariance(sums,nums),hbins
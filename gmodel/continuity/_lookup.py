@@ -0,0 +1,205 @@
+from functools import lru_cache
+
+import numpy
+
+from ._theoretical import Theoretical
+
+class Lookup():
+    """Tabulated semivariances of a Theoretical model with linear interpolation.
+
+    The model is tabulated on a uniform distance grid from zero to extent, the
+    grid is refined until the interpolation error at the points between the
+    nodes is within the error bound. Each interval stores the intercept and
+    gradient of its line side by side, so evaluation is an index computation,
+    a single table read and a multiply-add. The spherical, cubic, exponential and gaussian
+    models are within the bound of the sill beyond their default extent, so the
+    last node serves all farther distances; the other models fall back to the
+    analytic evaluation there.
+    Tables are cached per (Theoretical,extent,error) through Lookup.cached.
+    """
+
+    def __init__(self,theory:Theoretical,extent:float=None,error:float=1e-6,size:int=1024,maxsize:int=2**24):
+        """
+        theory  : Theoretical model to tabulate
+        extent  : (optional) largest tabulated distance, defaults to the distance
+                  where the model is within the error bound of the sill for the
+                  spherical, cubic, exponential and gaussian models and to four
+                  radii otherwise
+        error   : largest interpolation error allowed, relative to the sill
+        size    : initial number of grid intervals, doubled until error holds
+        maxsize : largest number of grid intervals before giving up
+        """
+        Lookup._check(theory)
+
+        saturation = {
+            "spherical"     : 1.,
+            "cubic"         : 1.,
+            "exponential"   : numpy.log(1/error)/3,
+            "gaussian"      : numpy.sqrt(numpy.log(1/error)/3),
+            }
+
+        self.saturated = extent is None and theory.model in saturation
+
+        if extent is None:
+
+            if theory.radius is None:
+                raise ValueError(f"The extent of the {theory.model} model table must be given.")
+
+            extent = theory.radius*saturation.get(theory.model,4.)
+
+        self.theory = theory
+        self.extent = float(extent)
+
+        bound = error*abs(theory.sill)
+
+        while True:
+
+            table = self._tabulate(size)
+
+            lines = self._lines(table)
+
+            # the worst linear interpolation error of smooth curves lies between the nodes
+            check = numpy.linspace(0,self.extent,4*size+1)[1:]
+
+            worst = numpy.abs(self._interpolate(check,lines)-theory(check)).max()
+
+            if worst<=bound:
+                break
+
+            if 2*size>maxsize:
+                raise ValueError(f"The {theory.model} model can not be tabulated within the error bound.")
+
+            size *= 2
+
+        self._table = table
+        self._lines = lines
+
+        self.error = worst
+
+    @staticmethod
+    def cached(theory:Theoretical,extent:float=None,error:float=1e-6):
+        """Returns the Lookup of the model, built on the first call only."""
+        Lookup._check(theory)
+        return Lookup._cached(theory,extent,error)
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _cached(theory:Theoretical,extent:float=None,error:float=1e-6):
+        return Lookup(theory,extent,error)
+
+    @staticmethod
+    def _check(theory:Theoretical):
+        """Raises ValueError for array-valued models, a table holds a single model."""
+        if theory.shape!=():
+            raise ValueError(f"A lookup table takes a single model, got parameters shaped {theory.shape}; tabulate each Theoretical.select(index) instead.")
+
+    @property
+    def sill(self):
+        return self.theory.sill
+
+    @property
+    def size(self):
+        """Returns the number of grid intervals of the table."""
+        return self._table.size-1
+
+    def __call__(self,bins,out=None,blocksize:int=2**14):
+        """Returns the semivariances at the distances in bins, the out and
+        blocksize arguments are the same as in Theoretical; the smaller default
+        block keeps the table reads and the work buffers in cache."""
+
+        bins = numpy.asarray(bins)
+
+        if out is None:
+            out = numpy.empty(bins.shape,dtype=numpy.result_type(bins.dtype,numpy.float32))
+        elif out.shape!=bins.shape or not out.flags.c_contiguous:
+            raise ValueError("The output array must be C-contiguous and shaped like bins.")
+
+        source,target = bins.reshape(-1),out.reshape(-1)
+
+        blocksize = min(blocksize,target.size)
+
+        work = numpy.empty(blocksize)
+        index = numpy.empty(blocksize,dtype=numpy.intp)
+        pair = numpy.empty((blocksize,2))
+
+        # the interpolation writes straight into float64 outputs unless they
+        # hold the distances still read by the masks below
+        direct = target.dtype==work.dtype and not numpy.may_share_memory(source,target)
+
+        for start in range(0,target.size,blocksize):
+
+            block = target[start:start+blocksize]
+
+            distance = source[start:start+block.size]
+
+            value = self._interpolate(distance,self._lines,block if direct else None,
+                work[:block.size],index[:block.size],pair[:block.size])
+
+            if not self.saturated:
+
+                beyond = distance>self.extent
+
+                if beyond.any():
+                    value[beyond] = self.theory(distance[beyond])
+
+            # the zero node holds the nugget, exact zeros are set apart
+            if self.theory.nugget:
+                value[distance<=0] = 0.
+
+            if not direct:
+                block[:] = value
+
+        return out
+
+    def covariance(self,bins,out=None,blocksize:int=2**14):
+        """Returns the covariances sill-gamma at the distances in bins."""
+
+        out = self(bins,out,blocksize)
+
+        numpy.subtract(self.sill,out,out=out)
+
+        return out
+
+    def _tabulate(self,size):
+        """Returns the model at size+1 nodes, the zero node holds the limit from
+        the positive side, i.e. the nugget."""
+
+        grid = numpy.linspace(0,self.extent,size+1)
+
+        table = self.theory(grid)
+
+        table[0] = self.theory.nugget
+
+        return table
+
+    def _lines(self,table):
+        """Returns the intercepts and gradients of the lines through adjacent
+        nodes as the columns of one array, the last node gets a flat line
+        serving the distances beyond."""
+
+        grid = numpy.linspace(0,self.extent,table.size)
+
+        gradient = numpy.append(numpy.diff(table)/numpy.diff(grid),0.)
+
+        intercept = table-gradient*grid
+
+        return numpy.stack((intercept,gradient),axis=1)
+
+    def _interpolate(self,distance,lines,out=None,work=None,index=None,pair=None):
+
+        work = numpy.empty(distance.shape) if work is None else work
+        index = numpy.empty(distance.shape,dtype=numpy.intp) if index is None else index
+        pair = numpy.empty(distance.shape+(2,)) if pair is None else pair
+
+        numpy.multiply(distance,(lines.shape[0]-1)/self.extent,out=work)
+
+        # truncation toward zero, the clip mode of take bounds the index to the table
+        numpy.copyto(index,work,casting="unsafe")
+
+        numpy.take(lines,index,axis=0,out=pair,mode="clip")
+
+        value = numpy.multiply(pair[:,1],distance,out=out)
+
+        value += pair[:,0]
+
+        return value
@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+
+import numpy
+
+from ._experimental import Experimental
+from ._theoretical import Theoretical
+
+@dataclass(frozen=True)
+class Structure:
+    """It is a single nested structure with its own ranges and orientation."""
+    model       : str   = "spherical"
+    contrib     : float = None
+    radius      : float = None
+    minor       : float = None
+    vertical    : float = None
+    azimuth     : float = 0.0
+    dip         : float = 0.0
+    power       : float = 1.0
+
+    def __post_init__(self):
+
+        if not self.unit.scaled:
+            raise ValueError(f"The {self.model} model takes no range and can not be a nested structure.")
+
+        if self.radius is None:
+            raise ValueError(f"The {self.model} structure needs a radius.")
+
+    @property
+    def scaling(self):
+        """Returns the (3,3) matrix mapping separation vectors to reduced distances:
+        the rotation into the major, minor and vertical directions, as in
+        Experimental.rotation, divided by the ranges along them. The minor and
+        vertical ranges default to the major range."""
+
+        minor = self.radius if self.minor is None else self.minor
+        vertical = self.radius if self.vertical is None else self.vertical
+
+        rotation = Experimental(azimuth=self.azimuth,dip=self.dip).rotation
+
+        return rotation/numpy.array([[self.radius],[minor],[vertical]])
+
+    @property
+    def unit(self):
+        """Returns the Theoretical of the structure evaluated at reduced distances."""
+        return Theoretical(self.model,sill=self.contrib,radius=1.,power=self.power)
+
+@dataclass(frozen=True)
+class Nested:
+    """It is a nugget effect plus a tuple of nested structures.
+
+    The semivariance is the sum of the nugget, for nonzero separations, and of
+    the structures. Evaluation runs over the input in blocks, every block
+    visiting all structures, so the only full-size array is the output."""
+    nugget      : float = 0.0
+    structures  : tuple[Structure] = ()
+
+    @property
+    def sill(self):
+        """Returns the total sill, the nugget plus the structure contributions."""
+        return self.nugget+sum(structure.contrib for structure in self.structures)
+
+    def __call__(self,bins,out=None,blocksize:int=2**16):
+        """Returns the semivariances at the distances in bins; anisotropic
+        structures are evaluated along their major direction.
+
+        out         : (optional) preallocated output array shaped like bins,
+                      it may be bins itself to overwrite the distances
+        blocksize   : number of distances evaluated per block
+        """
+        bins = numpy.asarray(bins)
+
+        out = self._output(bins.shape,bins.dtype,out)
+
+        flat = bins.reshape(-1)
+
+        for start,block in self._blocks(out,blocksize):
+
+            # copied, so that out may be bins itself
+            distance = numpy.array(flat[start:start+block.size])
+
+            block[:] = numpy.where(distance>0,self.nugget,0.)
+
+            for structure in self.structures:
+                block += structure.unit(distance/structure.radius)
+
+        return out
+
+    def vector(self,vector,out=None,blocksize:int=2**16):
+        """Returns the semivariances at the separation vectors, shape (...,d) with
+        d up to three components ordered as x, y and z.
+
+        out         : (optional) preallocated output array shaped like vector[...,0]
+        blocksize   : number of vectors evaluated per block
+        """
+        vector = numpy.asarray(vector)
+
+        out = self._output(vector.shape[:-1],vector.dtype,out)
+
+        flat = vector.reshape((-1,vector.shape[-1]))
+
+        scalings = [structure.scaling[:,:vector.shape[-1]].T for structure in self.structures]
+
+        for start,block in self._blocks(out,blocksize):
+
+            separation = flat[start:start+block.size]
+
+            block[:] = numpy.where(numpy.any(separation!=0,axis=1),self.nugget,0.)
+
+            for structure,scaling in zip(self.structures,scalings):
+                block += structure.unit(numpy.sqrt(((separation@scaling)**2).sum(axis=1)))
+
+        return out
+
+    def covariance(self,bins,out=None,blocksize:int=2**16):
+        """Returns the covariances sill-gamma at the distances in bins."""
+
+        out = self(bins,out,blocksize)
+
+        numpy.subtract(self.sill,out,out=out)
+
+        return out
+
+    @staticmethod
+    def _output(shape,dtype,out):
+
+        if out is None:
+            return numpy.empty(shape,dtype=numpy.result_type(dtype,numpy.float32))
+
+        if out.shape!=tuple(shape) or not out.flags.c_contiguous:
+            raise ValueError("The output array must be C-contiguous and shaped like the input.")
+
+        return out
+
+    @staticmethod
+    def _blocks(out,blocksize):
+        """Yields the start position and the flat view of each output block."""
+
+        flat = out.reshape(-1)
+
+        for start in range(0,flat.size,blocksize):
+            yield start,flat[start:start+blocksize]
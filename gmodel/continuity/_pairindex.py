@@ -0,0 +1,195 @@
+from functools import cached_property
+
+import numpy
+
+from ._binning import Binning
+from ._pairs import Pairs
+
+from ._experimental import Experimental
+
+from ._variogram import Variogram
+
+from gmodel.utils._spatial import Spatial
+
+class PairIndex():
+    """Distance-sorted index of the sample pairs of a dataset, built once and
+    reused for any Experimental configuration.
+
+    The lag classes of a configuration are contiguous slices of the sorted
+    pairs found by binary search, and the per-lag sums are differences of
+    prefix sums. Omnidirectional configurations never touch the pairs again
+    and cost O(lags log pairs). Directional ones test the separation vectors
+    of the pairs up to the last lag and reduce them the same way, so every
+    directional configuration, e.g. each step of an azimtol sweep, costs
+    O(pairs).
+    """
+
+    def __init__(self,data:Spatial,radius:float=numpy.inf,blocksize:int=None,memory:float=512):
+        """
+        data    : Spatial instance, the pairs carry its active property
+        radius  : (optional) largest pair distance kept in the index, pairs are
+                  enumerated through a KD-tree when it is finite
+        blocksize,memory : row blocking of the pair enumeration, as in
+                  Variogram.experimental with methods "tree" and "stream"
+        """
+        points = Pairs.points(data)
+
+        if numpy.isinf(radius):
+            blocks = Pairs.blocks(points,radius,blocksize,memory)
+        else:
+            blocks = Pairs.tree(points,radius,blocksize,memory)
+
+        blocks = [(numpy.empty(0,dtype=int),numpy.empty(0,dtype=int))]+list(blocks)
+
+        first,second = [numpy.concatenate(arrays) for arrays in zip(*blocks)]
+
+        distance = Pairs.distance(points,first,second)
+
+        order = numpy.argsort(distance,kind='stable')
+
+        first,second = first[order],second[order]
+
+        prop = numpy.ravel(data.prop)
+
+        self._radius = radius
+
+        self._distance = distance[order]
+        # separations along the axes of the data only, (d,npairs)
+        self._vector = numpy.ascontiguousarray((points[second]-points[first]).T)
+
+        self._value = (prop[second]-prop[first])**2
+
+        self._cumsum = numpy.concatenate(([0.],numpy.cumsum(self._value)))
+
+    @property
+    def radius(self):
+        """Returns the largest pair distance kept in the index."""
+        return self._radius
+
+    @cached_property
+    def _counts(self):
+        """Returns the pair count prefix of the omnidirectional configurations."""
+        return numpy.arange(self.size+1)
+
+    @property
+    def size(self):
+        """Returns the number of indexed pairs."""
+        return self._distance.size
+
+    def bounds(self,hbins,lagtol):
+        """Returns the start and stop positions of the lag slices in the sorted pairs."""
+        start = numpy.searchsorted(self._distance,hbins-lagtol,side='left')
+        stop = numpy.searchsorted(self._distance,hbins+lagtol,side='right')
+        return start,stop
+
+    def experimental(self,exp:Experimental):
+        """Returns the experimental variogram and the lag centers of exp."""
+        gamma,hbins = self.directional((exp,))
+        return gamma[0],hbins
+
+    def directional(self,exps:tuple[Experimental]):
+        """Returns the experimental variograms of several search directions sharing
+        lagdist, lagtol and outbound, gamma shape is (len(exps),nlags)."""
+
+        exp = Variogram._check(exps)
+
+        hbins = Variogram.bins(exp)
+
+        if hbins[-1]+exp.lagtol>self._radius:
+            raise ValueError("The last lag reaches beyond the radius of the pair index.")
+
+        start,stop = self.bounds(hbins,exp.lagtol)
+
+        sums = numpy.empty((len(exps),hbins.size))
+        nums = numpy.empty((len(exps),hbins.size))
+
+        for row,other in enumerate(exps):
+
+            cumsum,counts = self.prefix(other,stop.max())
+
+            sums[row] = cumsum[stop]-cumsum[start]
+            nums[row] = counts[stop]-counts[start]
+
+        return Binning.semivariance(sums,nums),hbins
+
+    def prefix(self,exp:Experimental,last:int=None):
+        """Returns the prefix sums of the squared differences and of the pair counts
+        over the first last sorted pairs falling in the search direction of exp.
+        Both arrays start with zero, so the sum over a slice is a difference."""
+
+        last = self.size if last is None else last
+
+        if self._omnidirectional(exp):
+            return self._cumsum,self._counts
+
+        inside = Variogram.direction(exp.rotation[:,:self._vector.shape[0]]@self._vector[:,:last],exp)
+
+        cumsum = numpy.concatenate(([0.],numpy.cumsum(self._value[:last]*inside)))
+        counts = numpy.concatenate(([0],numpy.cumsum(inside)))
+
+        return cumsum,counts
+
+    def scores(self,lagdist,lagtol,outbound,exp:Experimental=None,mincount:int=30,smoothing:float=1.):
+        """Returns the scores of candidate lag settings, lower is better.
+
+        lagdist,lagtol,outbound : candidate values, broadcast to shape (m,)
+        exp         : (optional) template of the search direction
+        mincount    : candidates with fewer pairs in any lag score infinity
+        smoothing   : weight of the roughness term
+
+        The score is the coefficient of variation of the lag pair counts plus
+        the root mean square second difference of the semivariances scaled by
+        the mean semivariance of all pairs. All candidates are evaluated in one
+        pass over the lags of all of them.
+        """
+        lagdist,lagtol,outbound = numpy.broadcast_arrays(*[numpy.atleast_1d(numpy.asarray(value,dtype=float))
+            for value in (lagdist,lagtol,outbound)])
+
+        # same number of lags as Variogram.bins
+        nlags = numpy.maximum(numpy.ceil(outbound/lagdist-0.5).astype(int),1)
+
+        candidate = numpy.repeat(numpy.arange(lagdist.size),nlags)
+
+        position = numpy.arange(candidate.size)-numpy.repeat(numpy.cumsum(nlags)-nlags,nlags)
+
+        hbins = lagdist[candidate]*(position+1)
+        htols = lagtol[candidate]
+
+        start,stop = self.bounds(hbins,htols)
+
+        cumsum,counts = self.prefix(Experimental() if exp is None else exp,stop.max())
+
+        nums = (counts[stop]-counts[start]).astype(float)
+
+        gamma = Binning.semivariance(cumsum[stop]-cumsum[start],nums)
+
+        reduce = lambda index,value: numpy.bincount(index,value,minlength=lagdist.size)
+
+        mean = reduce(candidate,nums)/nlags
+
+        with numpy.errstate(divide='ignore',invalid='ignore'):
+            balance = numpy.sqrt(reduce(candidate,(nums-mean[candidate])**2)/nlags)/mean
+
+        curvature = gamma[2:]-2*gamma[1:-1]+gamma[:-2]
+
+        inner = candidate[2:]==candidate[:-2]
+
+        scale = self._cumsum[-1]/(2*max(self.size,1)) or 1.
+
+        roughness = numpy.sqrt(reduce(candidate[2:][inner],curvature[inner]**2)/numpy.maximum(nlags-2,1))/scale
+
+        score = balance+smoothing*roughness
+
+        sparse = reduce(candidate,nums<mincount)>0
+        beyond = reduce(candidate,hbins+htols>self._radius)>0
+
+        score[sparse|beyond|~numpy.isfinite(score)] = numpy.inf
+
+        return score
+
+    @staticmethod
+    def _omnidirectional(exp:Experimental):
+        """Returns True if exp does not constrain the pair directions."""
+        params = exp.anisoparams
+        return (params["azimtol"]>=numpy.pi/2 and params["diptol"]>=numpy.pi/2
+            and numpy.isinf(params["bdwidth"]) and numpy.isinf(params["vbdwidth"]))
@@ -0,0 +1,155 @@
+import numpy
+
+from scipy.spatial import KDTree
+
+class Pairs():
+    """Enumerates sample pairs without building dense n×n matrices.
+
+    Every enumerator yields blocks of (first,second) index arrays with
+    first<second, so that each unordered pair is visited only once."""
+
+    # peak bytes of a row block per candidate pair: the float64 squared
+    # distances and one float64 temporary, the boolean masks and the two
+    # int64 index arrays of numpy.nonzero
+    NBYTES = 8+8+2+16
+
+    # peak bytes of a tree block per neighbor entry, both orientations of a pair
+    # and the self pairs are found: the int64 indices and float64 distances of
+    # sparse_distance_matrix, the boolean mask and the int64 kept indices
+    TREEBYTES = 24+1+16
+
+    @staticmethod
+    def points(data):
+        """Returns (n,d) coordinate array from the xaxis, yaxis and zaxis of data."""
+
+        axes = [getattr(data,name,None) for name in ("xaxis","yaxis","zaxis")]
+
+        return numpy.column_stack([numpy.ravel(axis) for axis in axes if axis is not None]).astype(float)
+
+    @staticmethod
+    def tree(points,radius,blocksize=None,memory=512,nbytes=0):
+        """Yields the pairs closer than radius found through a KD-tree index.
+        The rows are queried in blocks against the tree of all points, so only
+        the pairs of a block exist at once.
+
+        points    : (n,d) coordinate array
+        radius    : search radius, pairs beyond it are never built
+        blocksize : (optional) number of rows per block, overrides memory
+        memory    : memory budget in megabytes the block size is derived from,
+                    assuming every row has as many neighbors as the densest
+                    of a sample of rows
+        nbytes    : bytes the consumer of the blocks spends per yielded pair
+        """
+        size = points.shape[0]
+
+        tree = KDTree(points)
+
+        if blocksize is None:
+            sample = points[::max(size//1024,1)]
+            neighbors = tree.query_ball_point(sample,radius,return_length=True).max(initial=1)
+            blocksize = Pairs.blocksize(neighbors,memory,Pairs.TREEBYTES+nbytes)
+
+        for start in range(0,size,blocksize):
+
+            found = KDTree(points[start:start+blocksize]).sparse_distance_matrix(tree,radius,output_type='ndarray')
+
+            first,second = found['i'],found['j']
+
+            del found
+
+            first += start
+
+            upper = second>first
+
+            yield first[upper],second[upper]
+
+    @staticmethod
+    def blocks(points,radius=numpy.inf,blocksize=None,memory=512,nbytes=0):
+        """Yields the pairs closer than radius, streaming the rows of the
+        upper pair triangle in blocks so that the n×n matrices never exist.
+
+        points    : (n,d) coordinate array
+        radius    : (optional) search radius, farther pairs are dropped in the block
+        blocksize : (optional) number of rows per block, overrides memory
+        memory    : memory budget in megabytes the block size is derived from
+        nbytes    : bytes the consumer of the blocks spends per yielded pair
+        """
+        size = points.shape[0]
+
+        if blocksize is None:
+            blocksize = Pairs.blocksize(size,memory,Pairs.NBYTES+nbytes)
+
+        upper = numpy.arange(size)
+
+        for start in range(0,size-1,blocksize):
+
+            stop = min(start+blocksize,size-1)
+
+            inside = Pairs._inside(points,numpy.arange(start,stop),upper[start:],radius)
+
+            # keeps the pairs with second>first only
+            inside &= upper[start:]>upper[start:stop].reshape((-1,1))
+
+            first,second = numpy.nonzero(inside)
+
+            del inside
+
+            first += start
+            second += start
+
+            yield first,second
+
+    @staticmethod
+    def cross(points,rows,cols,radius=numpy.inf,blocksize=None,memory=512,nbytes=0):
+        """Yields the pairs closer than radius between the samples at rows and the
+        samples at cols. The index sets must be either disjoint or equal; for
+        equal sets each pair is yielded once, otherwise first is taken from rows.
+
+        points    : (n,d) coordinate array
+        rows,cols : sample index arrays
+        """
+        same = rows.size==cols.size and numpy.array_equal(rows,cols)
+
+        if blocksize is None:
+            blocksize = Pairs.blocksize(max(cols.size,1),memory,Pairs.NBYTES+nbytes)
+
+        for start in range(0,rows.size,blocksize):
+
+            block = rows[start:start+blocksize]
+
+            inside = Pairs._inside(points,block,cols,radius)
+
+            if same:
+                inside &= numpy.arange(cols.size)>numpy.arange(start,start+block.size).reshape((-1,1))
+
+            first,second = numpy.nonzero(inside)
+
+            del inside
+
+            yield block[first],cols[second]
+
+    @staticmethod
+    def _inside(points,rows,cols,radius):
+        """Returns the (rows,cols) mask of the sample pairs closer than radius,
+        the squared distances are accumulated in place over the axes."""
+
+        distance = numpy.zeros((rows.size,cols.size))
+
+        for axis in range(points.shape[1]):
+            square = numpy.subtract(points[cols,axis],points[rows,axis].reshape((-1,1)))
+            square *= square
+            distance += square
+            del square
+
+        return distance<=radius**2
+
+    @staticmethod
+    def blocksize(size,memory=512,nbytes=128):
+        """Returns the number of rows per block so that a block of pairs fits
+        in memory megabytes, nbytes is the peak bytes spent per pair."""
+        return max(int(memory*2**20//(nbytes*size)),1)
+
+    @staticmethod
+    def distance(points,first,second):
+        """Returns the separation distances of the pairs."""
+        return numpy.sqrt(((points[second]-points[first])**2).sum(axis=1))
@@ -1,17 +1,30 @@
 from dataclasses import dataclass
 
+import numpy
+
 @dataclass(frozen=True)
 class Theoretical:
-    """It is a variogram property dictionary."""
+    """It is a variogram property dictionary.
+
+    The model methods evaluate the semivariance over the input in blocks. Each
+    block computes the model shape in place in a single block-sized buffer and
+    writes it into the output, which may be preallocated and may be the input
+    array itself, so the peak memory stays close to the size of the input.
+    Single precision input gives single precision output.
+
+    The sill, radius, nugget and power may be arrays broadcasting to a common
+    parameter shape; the result then stacks the parameter sets over the input,
+    its shape is the parameter shape followed by the shape of bins.
+    """
     model       : str   = "spherical"
     sill        : float = None
     radius      : float = None
     nugget      : float = 0.0
     power       : float = 1.0
 
-    def __call__(self,bins):
+    def __call__(self,bins,out=None,blocksize:int=2**16):
 
-    	return getattr(self,self.model)(bins)
+        return getattr(self,self.model)(bins,out,blocksize)
 
     @property
     def params(self):
@@ -23,94 +36,178 @@ class Theoretical:
             "nugget"    : self.nugget
             }
 
-    def powermodel(self,bins):
+    @property
+    def shape(self):
+        """Returns the broadcast shape of the parameters, () for a single model."""
+        return numpy.broadcast_shapes(*[numpy.shape(value) for value in
+            (self.sill,self.radius,self.nugget,self.power) if value is not None])
+
+    @property
+    def scaled(self):
+        """Returns whether the model takes a radius, i.e. its shape is evaluated at
+        distances scaled by the radius; the power and de Wijs models are not."""
+        return self.model not in ("powermodel","dewijs")
+
+    def select(self,index):
+        """Returns the single model at index of the parameter shape."""
+
+        values = {}
+
+        for name in ("sill","radius","nugget","power"):
+
+            value = getattr(self,name)
+
+            if value is not None:
+                value = float(numpy.broadcast_to(value,self.shape)[index])
+
+            values[name] = value
+
+        return Theoretical(self.model,**values)
+
+    def covariance(self,bins,out=None,blocksize:int=2**16):
+        """Returns the covariances sill-gamma at the distances in bins; with out=bins
+        a distance matrix is overwritten with the covariance matrix."""
+
+        out = self(bins,out,blocksize)
+
+        numpy.subtract(self._column(self.sill,numpy.ndim(bins),out.dtype),out,out=out)
+
+        return out
+
+    def powermodel(self,bins,out=None,blocksize:int=2**16):
         """Power Model: """
-        
-        gamma = numpy.zeros_like(bins)
-        
-        gamma[bins>0] = self.nugget+(self.sill-self.nugget)*(bins[bins>0])**self.power
-        
-        return gamma
-
-    def spherical(self,bins):
+        return self._evaluate(bins,self._powermodel,False,out,blocksize)
+
+    def spherical(self,bins,out=None,blocksize:int=2**16):
         """Spherical Model: """
-        
-        gamma = numpy.zeros_like(bins)
-        
-        ratio = bins[bins>0]/self.radius
-        
-        gamma[bins>0] = self.nugget+(self.sill-self.nugget)*(3/2*ratio-1/2*ratio**3)
-        
-        gamma[bins>self.radius] = self.sill
-        
-        return gamma
-
-    def exponential(self,bins):
+        return self._evaluate(bins,self._spherical,True,out,blocksize)
+
+    def exponential(self,bins,out=None,blocksize:int=2**16):
         """Exponential Model: """
-        
-        gamma = numpy.zeros_like(bins)
-        
-        ratio = bins[bins>0]/self.radius
-        
-        gamma[bins>0] = self.nugget+(self.sill-self.nugget)*(1-numpy.exp(-3*ratio))
-        
-        return gamma
-
-    def gaussian(self,bins):
+        return self._evaluate(bins,self._exponential,True,out,blocksize)
+
+    def gaussian(self,bins,out=None,blocksize:int=2**16):
         """Gaussian Model: """
-        
-        gamma = numpy.zeros_like(bins)
-        
-        ratio = bins[bins>0]/self.radius
-        
-        gamma[bins>0] = self.nugget+(self.sill-self.nugget)*(1-numpy.exp(-3*ratio**2))
-        
-        return gamma
-
-    def holeeffect(self,bins):
+        return self._evaluate(bins,self._gaussian,True,out,blocksize)
+
+    def holeeffect(self,bins,out=None,blocksize:int=2**16):
         """Hole-Effect Model: """
-        
-        gamma = numpy.zeros_like(bins)
-        
-        ratio = bins[bins>0]/self.radius
-        
-        gamma[bins>0] = self.nugget+(self.sill-self.nugget)*(1-numpy.sin(ratio)/ratio)
-        
-        return gamma
-
-    def cubic(self,bins):
+        return self._evaluate(bins,self._holeeffect,True,out,blocksize)
+
+    def cubic(self,bins,out=None,blocksize:int=2**16):
         """Cubic Model: """
-        
-        gamma = numpy.zeros_like(bins)
-        
-        ratio = bins[bins>0]/self.radius
-        
-        gamma[bins>0] = self.nugget+(self.sill-self.nugget)*(7*ratio**2-35/4*ratio**3+7/2*ratio**5-3/4*ratio**7)
-        
-        gamma[bins>self.radius] = self.sill
-        
-        return gamma
-
-    def cauchy(self,bins):
+        return self._evaluate(bins,self._cubic,True,out,blocksize)
+
+    def cauchy(self,bins,out=None,blocksize:int=2**16):
         """Cauchy Model: """
-        
-        gamma = numpy.zeros_like(bins)
-        
-        ratio = bins[bins>0]/self.radius
-        
-        gamma[bins>0] = self.nugget+(self.sill-self.nugget)*(1-1/(1+ratio**2))
-        
-        return gamma
-
-    def dewijs(self,bins):
+        return self._evaluate(bins,self._cauchy,True,out,blocksize)
+
+    def dewijs(self,bins,out=None,blocksize:int=2**16):
         """Dewijs Model: """
-        
-        gamma = numpy.zeros_like(bins)
-        
-        gamma[bins>0] = self.nugget+(self.sill-self.nugget)*numpy.log(bins[bins>0])
-        
-        return gamma
+        return self._evaluate(bins,self._dewijs,False,out,blocksize)
+
+    def _evaluate(self,bins,shape,scaled:bool,out=None,blocksize:int=2**16):
+        """Returns nugget+(sill-nugget)*shape at the positive distances and zero
+        elsewhere, shape works in place on the (scaled) distances of a block.
+
+        out         : (optional) C-contiguous output array shaped like bins,
+                      it may be bins itself
+        blocksize   : number of distances evaluated per block
+        """
+        bins = numpy.asarray(bins)
+
+        params = self.shape
+
+        if out is None:
+            out = numpy.empty(params+bins.shape,dtype=numpy.result_type(bins.dtype,numpy.float32))
+        elif out.shape!=params+bins.shape or not out.flags.c_contiguous:
+            raise ValueError("The output array must be C-contiguous and shaped like the parameters and bins.")
+
+        source,target = bins.reshape(-1),out.reshape(params+(-1,))
+
+        # parameters in the output precision keep the in-place ufuncs unbuffered
+        sill,nugget = self._column(self.sill,1,out.dtype),self._column(self.nugget,1,out.dtype)
+
+        radius = self._column(self.radius,1,out.dtype) if scaled else None
+
+        for start in range(0,source.size,blocksize):
+
+            block = target[...,start:start+blocksize]
+
+            distance = source[start:start+block.shape[-1]]
+
+            positive = distance>0
+
+            value = numpy.empty(block.shape,dtype=block.dtype)
+
+            value[...] = distance
+
+            if scaled:
+                value /= radius
+
+            with numpy.errstate(divide='ignore',invalid='ignore'):
+                shape(value)
+
+            value *= sill-nugget
+            value += nugget
+
+            block[...] = 0.
+
+            numpy.copyto(block,value,where=positive)
+
+        return out
+
+    @staticmethod
+    def _column(value,ndim:int=1,dtype=None):
+        """Returns the parameter with ndim trailing axes to broadcast over the input."""
+        return numpy.reshape(numpy.asarray(value,dtype=dtype),numpy.shape(value)+(1,)*ndim)
+
+    def _powermodel(self,value):
+        numpy.power(value,self._column(self.power,1,value.dtype),out=value)
+
+    def _spherical(self,value):
+        numpy.minimum(value,1.,out=value)
+        square = value*value
+        square *= -1/2
+        square += 3/2
+        value *= square
+
+    def _exponential(self,value):
+        value *= -3
+        numpy.exp(value,out=value)
+        numpy.subtract(1.,value,out=value)
+
+    def _gaussian(self,value):
+        value *= value
+        self._exponential(value)
+
+    def _holeeffect(self,value):
+        sine = numpy.sin(value)
+        numpy.divide(sine,value,out=value)
+        numpy.subtract(1.,value,out=value)
+
+    def _cubic(self,value):
+        numpy.minimum(value,1.,out=value)
+        # 7r²-35/4r³+7/2r⁵-3/4r⁷ in Horner form
+        poly = value*value
+        poly *= -3/4
+        poly += 7/2
+        poly *= value
+        poly *= value
+        poly += -35/4
+        poly *= value
+        poly += 7
+        value *= value
+        value *= poly
+
+    def _cauchy(self,value):
+        value *= value
+        denominator = value+1.
+        value /= denominator
+
+    def _dewijs(self,value):
+        numpy.log(value,out=value)
 
 if __name__ == "__main__":
 
-    pass
\ No newline at end of file
+    pass
@@ -1,9 +1,19 @@
+from dataclasses import replace
+
 from matplotlib import pyplot
 
 import numpy
 
-from gmodel.gstats.variogram import Experimental
-from gmodel.gstats.variogram import Theoretical
+from scipy.stats import norm
+
+from ._binning import Binning
+from ._bootstrap import Resample
+from ._pairs import Pairs
+
+from ._experimental import Experimental
+from ._theoretical import Theoretical
+
+from gmodel.utils._spatial import Spatial
 
 class Variogram():
 
@@ -14,14 +24,69 @@ class Variogram():
     @staticmethod
     def azimbool(data:Spatial,exp:Experimental):
 
+        vector = numpy.tensordot(exp.rotation,Variogram._deltas(data),axes=1)
+
+        return Variogram.direction(vector,exp)
+
+    @staticmethod
+    def direction(vector,exp:Experimental):
+        """Returns boolean array marking the pairs inside the search direction.
+
+        vector  : (3,...) pair separation components along the search direction,
+                  across it horizontally and across it vertically, i.e. the pair
+                  vectors rotated by Experimental.rotation
+
+        As in GSLIB gamv, the horizontal projection of a pair is tested against
+        the azimuth, azimtol and bdwidth, and the inclination of the pair within
+        the vertical plane of the azimuth is tested against the dip, diptol and
+        vbdwidth. The test is symmetric, so both orientations of a pair are
+        treated alike. Tolerance angles of 90 degrees or more do not constrain
+        the direction.
+        """
         params = exp.anisoparams
 
-        thetadelta = numpy.abs(data.azimmat-params["azimuth"])
+        cosdip,sindip = numpy.cos(params["dip"]),numpy.sin(params["dip"])
+
+        along,across,normal = vector
+
+        # components along the azimuth in the horizontal plane and along +z
+        horizontal = cosdip*along-sindip*normal
+        vertical = sindip*along+cosdip*normal
+
+        across = numpy.abs(across)
+
+        inside = across<=params["bdwidth"]/2.
+
+        if params["azimtol"]<numpy.pi/2:
+            inside &= across<=numpy.abs(horizontal)*numpy.tan(params["azimtol"])
+
+        # horizontal length signed by the side of the azimuth the pair points to
+        length = numpy.copysign(numpy.sqrt(horizontal**2+across**2),horizontal)
+
+        offset = numpy.abs(cosdip*vertical-sindip*length)
+
+        inside &= offset<=params["vbdwidth"]/2.
+
+        if params["diptol"]<numpy.pi/2:
+            inside &= offset<=numpy.abs(cosdip*length+sindip*vertical)*numpy.tan(params["diptol"])
+
+        return inside
+
+    @staticmethod
+    def _deltas(data:Spatial):
+        """Returns (3,n,n) x, y and z separation matrices of data, missing axes are zero."""
+
+        deltas = [getattr(data,name,None) for name in ("xdelta","ydelta","zdelta")]
+
+        return numpy.array([numpy.zeros(deltas[0].shape) if delta is None else delta for delta in deltas])
+
+    @staticmethod
+    def _rotate(points,exp:Experimental):
+        """Returns (n,3) coordinates rotated into the search direction frame."""
+
+        rotation = exp.rotation[:,:points.shape[1]]
 
-        atolbool = thetadelta<=params["azimtol"]
-        bandbool = numpy.sin(thetadelta)*data.distmat<=(params['bdwidth']/2.)
-        
-        return numpy.logical_and(atolbool,bandbool)
+        return points@rotation.T
 
     @staticmethod
     def anisolag(data:Spatial,exp:Experimental):
@@ -54,33 +119,384 @@ class Variogram():
             )
 
     @staticmethod
-    def experimental(data:Spatial,exp:Experimental):
-        """anisoparams calculations are carried only in 2D space:
+    def experimental(data:Spatial,exp:Experimental,method:str="dense",blocksize:int=None,memory:float=512):
+        """anisoparams define a search direction in 3D space:
 
         azimuth : search direction, range is (-pi,pi] in radians
                   and (-180,180] in degrees. If we set +x to east and
                   +y to north then the azimuth is selected to be zero in the
                   +x direction and positive counterclockwise.
+
+        dip     : inclination of the search direction from the horizontal
+                  plane, positive towards +z. As in GSLIB gamv, azimtol and
+                  bdwidth bound the horizontal projection of the pairs around
+                  the azimuth; diptol and vbdwidth bound the pairs around the
+                  dip within the vertical plane of the azimuth.
+
+        method  : "dense" works on the condensed pair distances and separations of data,
+                  "tree" enumerates only the pairs within the outbound distance
+                  (plus lag tolerance) through a KD-tree built on data coordinates,
+                  querying the rows in blocks sized from the memory budget.
+                  "stream" processes the pairs in row blocks computed from data
+                  coordinates, keeping the peak memory within the budget.
+
+        blocksize : number of rows per block for the "tree" and "stream" methods
+        memory    : memory budget in megabytes for the "tree" and "stream"
+                    methods, it sets the blocksize when the latter is not given
+
+        Each unordered pair of distinct samples is counted once.
         """
-        
-        delta = data.delta**2
+        gamma,hbins = Variogram.directional(data,(exp,),method,blocksize,memory)
 
-        abool = Variogram.azimbool(data,exp)
-        hbins = Variogram.bins(exp)
+        return gamma[0],hbins
+
+    @staticmethod
+    def directional(data:Spatial,exps:tuple[Experimental],method:str="dense",blocksize:int=None,memory:float=512):
+        """Returns the experimental variograms of several search directions filled
+        in one pass over the pairs, gamma shape is (len(exps),nlags). The lag
+        class and the separation vector of each pair are computed only once.
+
+        All Experimental instances must share lagdist, lagtol and outbound; the
+        remaining arguments are the same as in the experimental method.
+        """
+        sums,nums,hbins = Variogram._accumulate(data,data.prop,exps,method,blocksize,memory)
+
+        return Binning.semivariance(sums,nums),hbins
+
+    @staticmethod
+    def cross(data:Spatial,exp:Experimental,props=None,method:str="dense",blocksize:int=None,memory:float=512):
+        """Returns the direct and cross variograms of all property combinations
+        filled in one pass over the pairs, gamma shape is (nprops,nprops,nlags)
+        where gamma[a,a] is the variogram of property a and gamma[a,b] is the
+        cross variogram of properties a and b.
+
+        props   : (optional) (n,nprops) property columns measured at all data
+                  locations, defaults to all property columns of data
+
+        The remaining arguments are the same as in the experimental method.
+        """
+        props = numpy.asarray(data.props if props is None else props,dtype=float)
 
-        gamma = numpy.zeros_like(hbins)
-        
-        for i,h in enumerate(hbins):
+        sums,nums,hbins = Variogram._accumulate(data,props,(exp,),method,blocksize,memory)
 
-            dbool = numpy.abs(data.distmat-h)<=exp.params['lagtol']
-            cbool = numpy.logical_and(dbool,abool)
+        first,second = numpy.triu_indices(props.shape[1])
 
-            N = numpy.count_nonzero(cbool)
+        gamma = numpy.empty((props.shape[1],props.shape[1],hbins.size))
 
-            gamma[i] = numpy.nan if N==0 else delta[cbool].sum()/(2*N)
+        gamma[first,second] = gamma[second,first] = Binning.semivariance(sums[0],nums[0])
 
         return gamma,hbins
 
+    @staticmethod
+    def rose(exp:Experimental,num:int):
+        """Returns num Experimental instances evenly covering the azimuths in [0,180),
+        each with half-angle tolerance of 90/num degrees and the bandwidth of exp."""
+
+        return tuple(replace(exp,azimuth=index*180./num,azimtol=90./num) for index in range(num))
+
+    @staticmethod
+    def automatic(data:Spatial,exp:Experimental=None,index=None,fractions=(0.25,1/3.,0.5),nlags=range(6,31),lagtols=(0.5,0.625,0.75),mincount:int=30,smoothing:float=1.,radius:float=None):
+        """Returns the Experimental whose lagdist, lagtol and outbound score best
+        among the candidate combinations, see PairIndex.scores.
+
+        exp         : (optional) template of the search direction, its lag
+                      settings are ignored
+        index       : (optional) PairIndex of data, built when not given; pass
+                      it in to reuse the pairs between calls
+        fractions   : candidate outbounds as fractions of the data extent
+        nlags       : candidate numbers of lags up to the outbound
+        lagtols     : candidate lag tolerances as fractions of lagdist
+        radius      : (optional) radius of the PairIndex built when index is
+                      not given, defaults to the largest candidate outbound
+
+        The candidate outbounds are clipped so that their last lag, tolerance
+        included, stays within the radius of the index.
+        """
+        from ._pairindex import PairIndex
+
+        exp = Experimental() if exp is None else exp
+
+        points = Pairs.points(data)
+
+        extent = numpy.sqrt(((points.max(axis=0)-points.min(axis=0))**2).sum())
+
+        if index is None:
+            index = PairIndex(data,max(fractions)*extent if radius is None else radius)
+
+        outbound,nlag,lagtol = numpy.meshgrid(numpy.asarray(fractions)*extent,nlags,lagtols,indexing='ij')
+
+        # the last lag center is at the outbound, it reaches one lag tolerance beyond
+        outbound = numpy.minimum(outbound,index.radius/(1+lagtol/nlag))
+
+        outbound,lagdist = outbound.ravel(),(outbound/nlag).ravel()
+
+        lagtol = lagtol.ravel()*lagdist
+
+        scores = index.scores(lagdist,lagtol,outbound,exp,mincount,smoothing)
+
+        if not numpy.isfinite(scores).any():
+            raise ValueError("No candidate lag setting has enough pairs in every lag.")
+
+        best = numpy.argmin(scores)
+
+        return replace(exp,lagdist=float(lagdist[best]),lagtol=float(lagtol[best]),outbound=float(outbound[best]))
+
+    @staticmethod
+    def estimators(data:Spatial,exp:Experimental,method:str="dense",blocksize:int=None,memory:float=512,resolution:int=1024):
+        """Returns the classical, Cressie-Hawkins, Dowd and madogram estimates along
+        with the pair counts and mean lag distances, all filled in one pass over
+        the pairs, as a dictionary of (nlags,) arrays and the lag centers.
+
+        resolution : number of bins in the per-lag histograms of absolute differences
+                     spanning the property range; the Dowd median is interpolated
+                     from them, so no pair difference needs to be stored
+
+        The remaining arguments are the same as in the experimental method.
+        """
+        prop = numpy.ravel(data.prop).astype(float)
+
+        width = (prop.max()-prop.min())/resolution or 1.
+
+        hbins,blocks = Variogram._blocks(data,(exp,),method,blocksize,memory)
+
+        sums = numpy.zeros((4,hbins.size))
+        nums = numpy.zeros((1,hbins.size))
+
+        hist = numpy.zeros(hbins.size*resolution)
+
+        for first,second,distance,lags,weights in blocks:
+
+            difference = numpy.abs(prop[second]-prop[first])
+
+            value = numpy.array([difference**2,numpy.sqrt(difference),difference,distance])
+
+            bsums,bnums = Binning.reduce(lags,value,hbins.size,weights)
+
+            sums += bsums
+            nums += bnums
+
+            index = numpy.minimum((difference/width).astype(numpy.intp),resolution-1)
+
+            hist += numpy.bincount(lags*resolution+index,weights=weights[0],minlength=hist.size)
+
+        nums = nums[0]
+
+        with numpy.errstate(divide='ignore',invalid='ignore'):
+            mean = numpy.where(nums>0,sums/nums,numpy.nan)
+
+        median = Binning.median(hist.reshape((hbins.size,resolution)),width)
+
+        return {
+            "classical" : Binning.semivariance(sums[0],nums),
+            "cressie"   : mean[1]**4/(2*(0.457+0.494/numpy.maximum(nums,1))),
+            "dowd"      : 2.198*median**2/2,
+            "madogram"  : mean[2]/2,
+            "nums"      : nums,
+            "lagmean"   : mean[3],
+            },hbins
+
+    @staticmethod
+    def bootstrap(data:Spatial,exp:Experimental,replicates:int=500,percentiles=(2.5,50.,97.5),mode:str="bootstrap",cellsize:float=None,workers:int=None,seed:int=None,method:str="dense",blocksize:int=None,memory:float=512):
+        """Returns per-lag percentile bands of the experimental variogram, shape is
+        (len(percentiles),nlags), and the lag centers.
+
+        replicates  : number of bootstrap replicates
+        percentiles : percentiles of the bands in the range [0,100]
+        mode        : "bootstrap" resamples the samples with replacement and takes
+                      the percentiles of the replicates, "jackknife" leaves one
+                      sample out at a time and builds normal bands from the
+                      jackknife standard error
+        cellsize    : (optional) resamples spatial blocks of this size instead
+                      of single samples
+        workers     : number of worker processes, defaults to the cpu count
+        seed        : seed of the random generator for bootstrap replicates
+
+        The pair geometry is computed once and shared by all replicates; the
+        remaining arguments are the same as in the experimental method.
+        """
+        hbins,blocks = Variogram._blocks(data,(exp,),method,blocksize,memory)
+
+        prop = numpy.ravel(data.prop).astype(float)
+
+        first,second,lags,weights = [numpy.concatenate(arrays) for arrays in
+            zip(*[(block[0],block[1],block[3],block[4][0]) for block in blocks])]
+
+        inside = weights>0
+
+        first,second,lags = first[inside],second[inside],lags[inside]
+
+        geometry = (first,second,lags,weights[inside],(prop[second]-prop[first])**2,hbins.size)
+
+        groups = None if cellsize is None else Resample.groups(Pairs.points(data),cellsize)
+
+        if mode=="bootstrap":
+
+            counts = Resample.bootstrap(prop.size,replicates,groups,seed)
+
+            gamma = Resample.run(counts,geometry,workers)
+
+            return numpy.nanpercentile(gamma,percentiles,axis=0),hbins
+
+        if mode=="jackknife":
+
+            counts = Resample.jackknife(prop.size,groups)
+
+            gamma = Resample.run(counts,geometry,workers)
+
+            full = Resample.gamma(numpy.ones((1,prop.size),dtype=int),geometry)[0]
+
+            error = numpy.sqrt((counts.shape[0]-1)*numpy.nanvar(gamma,axis=0))
+
+            quantile = norm.ppf(numpy.asarray(percentiles)/100.).reshape((-1,1))
+
+            return full+quantile*error,hbins
+
+        raise ValueError(f"Unknown resampling mode: {mode}")
+
+    @staticmethod
+    def _accumulate(data:Spatial,prop,exps:tuple[Experimental],method:str,blocksize:int,memory:float):
+        """Returns per-lag sums of squared differences (products of differences for
+        several properties), pair counts and the lag centers for all directions.
+
+        prop    : (n,) property values or (n,nprops) property columns; the sums
+                  have shape (ndir,nlags) or (ndir,ncombs,nlags) respectively
+                  where the combinations follow numpy.triu_indices(nprops)
+        """
+        prop = numpy.asarray(prop,dtype=float)
+
+        rows = Variogram._products(prop[:0]-prop[:0]).shape[:-1]
+
+        hbins,blocks = Variogram._blocks(data,exps,method,blocksize,memory,int(numpy.prod(rows)))
+
+        sums = numpy.zeros((len(exps),)+rows+(hbins.size,))
+        nums = numpy.zeros((len(exps),)+(1,)*len(rows)+(hbins.size,))
+
+        for first,second,distance,lags,weights in blocks:
+
+            value = Variogram._products(prop[second]-prop[first])
+
+            bsums,bnums = Binning.reduce(lags,value,hbins.size,weights.reshape(nums.shape[:-1]+(-1,)))
+
+            sums += bsums
+            nums += bnums
+
+        return sums,nums,hbins
+
+    @staticmethod
+    def _products(difference):
+        """Returns squared pair differences for a single property, (npairs,), or
+        the products of differences of all property combinations, (ncombs,npairs)."""
+
+        if difference.ndim==1:
+            return difference**2
+
+        first,second = numpy.triu_indices(difference.shape[1])
+
+        return difference.T[first]*difference.T[second]
+
+    @staticmethod
+    def _check(exps:tuple[Experimental]):
+        """Returns the first Experimental after checking that all of them share
+        lagdist, lagtol and outbound, so that they share the lag classes."""
+
+        exp = exps[0]
+
+        if any(other.params!=exp.params for other in exps):
+            raise ValueError("Directional variograms must share lagdist, lagtol and outbound.")
+
+        return exp
+
+    @staticmethod
+    def _blocks(data:Spatial,exps:tuple[Experimental],method:str="dense",blocksize:int=None,memory:float=512,ncombs:int=1):
+        """Returns the lag centers and a generator of the pair blocks inside the lags.
+        Each block is (first,second,distance,lags,weights) where first<second are
+        the sample indices, lags the lag indices and weights the (ndir,npairs)
+        membership of the pairs in the search directions. The number of property
+        combinations reduced per pair, ncombs, enters the stream block size."""
+
+        exp = Variogram._check(exps)
+
+        hbins = Variogram.bins(exp)
+
+        if method=="dense":
+            return hbins,Variogram._denseblocks(data,exps,hbins)
+
+        points = Pairs.points(data)
+
+        if method=="tree":
+            blocks = Pairs.tree(points,hbins[-1]+exp.lagtol,blocksize,memory,Variogram._pairbytes(len(exps),ncombs))
+        elif method=="stream":
+            blocks = Pairs.blocks(points,hbins[-1]+exp.lagtol,blocksize,memory,Variogram._pairbytes(len(exps),ncombs))
+        else:
+            raise ValueError(f"Unknown experimental variogram method: {method}")
+
+        return hbins,Variogram._pointblocks(points,exps,hbins,blocks)
+
+    @staticmethod
+    def _pairbytes(ndir:int=1,ncombs:int=1):
+        """Returns the peak bytes the block processing spends per streamed pair:
+        the pair indices, the coordinate gathers and differences of the
+        separation distances and the lag classification temporaries, plus the
+        weighted products and bincount indices of every direction and property
+        combination, measured with tracemalloc."""
+        return 120+24*ndir*ncombs
+
+    @staticmethod
+    def _denseblocks(data:Spatial,exps:tuple[Experimental],hbins,blocksize:int=2**18):
+        """Yields the pair blocks of the condensed pair geometry of data, the lag
+        classes and separations are computed for blocksize condensed positions
+        at a time, so only the condensed distances of data are kept."""
+
+        exp = exps[0]
+
+        distvec = data.distvec
+
+        points = Pairs.points(data)
+
+        for start in range(0,max(distvec.size,1),blocksize):
+
+            pairs,lags = Binning.classes(distvec[start:start+blocksize],hbins,exp.lagdist,exp.lagtol)
+
+            pairs += start
+
+            first,second = data.unravel(pairs)
+
+            # separations of the in-lag pairs only, the condensed deltas of data are never built
+            vector = numpy.zeros((3,lags.size))
+
+            vector[:points.shape[1]] = (points[second]-points[first]).T
+
+            weights = numpy.empty((len(exps),lags.size))
+
+            for row,other in zip(weights,exps):
+                row[:] = Variogram.direction(other.rotation@vector,other)
+
+            yield first,second,distvec[pairs],lags,weights
+
+    @staticmethod
+    def _pointblocks(points,exps:tuple[Experimental],hbins,blocks):
+        """Yields the pair blocks enumerated from coordinates. The coordinates are
+        rotated into each search direction frame once, before the sweep."""
+
+        exp = exps[0]
+
+        rotated = [Variogram._rotate(points,other) for other in exps]
+
+        for first,second in blocks:
+
+            distance = Pairs.distance(points,first,second)
+
+            pairs,lags = Binning.classes(distance,hbins,exp.lagdist,exp.lagtol)
+
+            first,second = first[pairs],second[pairs]
+
+            weights = numpy.empty((len(exps),lags.size))
+
+            for row,other,coords in zip(weights,exps,rotated):
+                row[:] = Variogram.direction((coords[second]-coords[first]).T,other)
+
+            yield first,second,distance[pairs],lags,weights
+
     @staticmethod
     def azimtol(exp:Experimental):
 
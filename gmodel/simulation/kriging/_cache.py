@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+import hashlib
+
+import numpy
+
+class Cache():
+	"""Least recently used store of kriging matrices under a memory budget.
+
+	The entries are keyed by the variogram model, a frozen and hashable
+	Theoretical, and the fingerprint of the observation coordinates, so the
+	matrices are shared by every kriging instance on the same sample set.
+	"""
+
+	def __init__(self,memory:float=1024):
+		"""
+		memory 	: memory budget in megabytes; the least recently used entries are
+				  evicted beyond it, the most recent entry is always kept
+		"""
+		self.memory = memory
+
+		self._items = OrderedDict()
+
+		self.nbytes = 0
+
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def fingerprint(points):
+		"""Returns hash of the coordinate array, equal for equal coordinates."""
+
+		points = numpy.ascontiguousarray(points,dtype=float)
+
+		digest = hashlib.sha1(str(points.shape).encode())
+
+		digest.update(points.tobytes())
+
+		return digest.hexdigest()
+
+	def get(self,key,build):
+		"""Returns the entry of key, the result of build() is stored on a miss.
+		Array entries, or tuples of arrays, are made read-only."""
+
+		if key in self._items:
+			self.hits += 1
+			self._items.move_to_end(key)
+			return self._items[key]
+
+		self.misses += 1
+
+		value = build()
+
+		for array in (value if isinstance(value,tuple) else (value,)):
+			if isinstance(array,numpy.ndarray):
+				array.flags.writeable = False
+
+		self._items[key] = value
+
+		self.nbytes += self._nbytes(value)
+
+		while self.nbytes>self.memory*2**20 and len(self._items)>1:
+			self.nbytes -= self._nbytes(self._items.popitem(last=False)[1])
+
+		return value
+
+	def clear(self):
+		"""Removes all entries and resets the counters."""
+		self._items.clear()
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self._items)
+
+	def __contains__(self,key):
+		return key in self._items
+
+	@staticmethod
+	def _nbytes(value):
+		return sum(getattr(array,"nbytes",0) for array in (value if isinstance(value,tuple) else (value,)))
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+
+import numpy
+
+from scipy.spatial import KDTree
+
+from gmodel.continuity._experimental import Experimental
+
+@dataclass(frozen=True)
+class Neighborhood:
+	"""It is a moving search neighborhood for local kriging.
+
+	radius 	: search range along the major direction, inf searches everywhere
+	minor 	: search range across it horizontally, defaults to radius
+	vertical: search range across it vertically, defaults to radius
+	azimuth : major direction in degrees, as in Experimental
+	dip 	: inclination of the major direction in degrees, as in Experimental
+
+	maxcount: largest number of neighbors of a target
+	mincount: smallest number of neighbors, targets with fewer are not estimated
+	octant 	: (optional) largest number of neighbors per octant of the search
+			  frame (quadrant in 2D), zero does not constrain
+	candidates : (optional) number of nearest samples the neighbors are picked
+			  from, defaults to four times the largest possible neighbor count
+	"""
+	radius 		: float = numpy.inf
+	minor 		: float = None
+	vertical 	: float = None
+	azimuth 	: float = 0.0
+	dip 		: float = 0.0
+	maxcount 	: int 	= 16
+	mincount 	: int 	= 1
+	octant 		: int 	= 0
+	candidates 	: int 	= None
+
+	def transform(self,points):
+		"""Returns (n,3) coordinates in which the search ellipsoid is the unit
+		sphere, or only rotated into the search frame for infinite radius."""
+
+		ranges = numpy.ones(3)
+
+		if numpy.isfinite(self.radius):
+			ranges[:] = [self.radius,
+				self.radius if self.minor is None else self.minor,
+				self.radius if self.vertical is None else self.vertical]
+
+		rotation = Experimental(azimuth=self.azimuth,dip=self.dip).rotation
+
+		return points@(rotation/ranges.reshape((-1,1)))[:,:points.shape[1]].T
+
+	def tree(self,obs):
+		"""Returns the KDTree of the (n,d) obs points in the search frame, built
+		once for repeated searches over target blocks."""
+		return KDTree(self.transform(obs))
+
+	def search(self,obs,est,tree:KDTree=None):
+		"""Returns the (m,maxcount) neighbor indices of the est points among the obs
+		points sorted by the anisotropic distance, padded with -1, and the (m,)
+		neighbor counts. Both point arrays are shaped (n,d).
+
+		tree 	: (optional) KDTree of the obs points from the tree method
+		"""
+		tree = self.tree(obs) if tree is None else tree
+
+		obs,est = tree.data,self.transform(est)
+
+		bound = 1. if numpy.isfinite(self.radius) else numpy.inf
+
+		limit = self.maxcount if self.octant==0 else min(self.maxcount,8*self.octant)
+
+		candidates = 4*limit if self.candidates is None else self.candidates
+
+		candidates = max(min(candidates,obs.shape[0]),1)
+
+		distance,index = tree.query(est,k=candidates,distance_upper_bound=bound)
+
+		distance,index = distance.reshape((est.shape[0],-1)),index.reshape((est.shape[0],-1))
+
+		keep = numpy.isfinite(distance)
+
+		if self.octant>0:
+
+			offset = obs[numpy.minimum(index,obs.shape[0]-1)]-est[:,numpy.newaxis,:]
+
+			octant = (offset>=0)@numpy.array([1,2,4])
+
+			rank = numpy.zeros(index.shape,dtype=int)
+
+			for label in range(8):
+				inside = keep&(octant==label)
+				rank += numpy.where(inside,numpy.cumsum(inside,axis=1)-1,0)
+
+			keep &= rank<self.octant
+
+		# the kept candidates move to the front in their distance order
+		order = numpy.argsort(~keep,axis=1,kind='stable')
+
+		index = numpy.take_along_axis(index,order,axis=1)[:,:self.maxcount]
+
+		counts = numpy.minimum(keep.sum(axis=1),self.maxcount)
+
+		index[numpy.arange(index.shape[1])>=counts.reshape((-1,1))] = -1
+
+		if index.shape[1]<self.maxcount:
+			index = numpy.pad(index,((0,0),(0,self.maxcount-index.shape[1])),constant_values=-1)
+
+		return index,counts
@@ -5,13 +5,30 @@ if __name__ == "__main__":
 
 import numpy
 
+from scipy.linalg import cho_factor
+from scipy.linalg import cho_solve
+from scipy.linalg import lu_factor
+from scipy.linalg import lu_solve
+
 from scipy.stats import norm
 
-from utils._spatial import Spatial
+from gmodel.utils._spatial import Spatial
+
+from gmodel.continuity._theoretical import Theoretical
 
-from gmodel.gstats.variogram._theoretical import Theoretical
+from gmodel.simulation.kriging._cache import Cache
+from gmodel.simulation.kriging._neighborhood import Neighborhood
+from gmodel.simulation.kriging._parallel import Parallel
 
 class Ordinary():
+	"""Ordinary kriging of the observation property at estimation locations.
+
+	The variogram model may carry array-valued parameters, see Theoretical;
+	all parameter sets are then solved in one batch and the estimates and
+	variances are stacked with the parameter shape leading.
+	"""
+
+	cache = Cache()
 
 	def __init__(self,obs:Spatial,var:Theoretical):
 
@@ -19,33 +36,182 @@ class Ordinary():
 
 		self._var = var
 
-	def estimate(self,est:Spatial):
-		"""Returns the best estimated values and varitation for est data."""
+	@property
+	def key(self):
+		"""Returns the cache key of the observation matrices: the variogram model
+		and the fingerprint of the observation coordinates."""
+		var = self._var
+
+		try:
+			hash(var)
+		except TypeError:
+			# array-valued models are keyed by the hashes of their parameters
+			var = (var.model,)+tuple(Cache.fingerprint(numpy.asarray(value,dtype=float))
+				for value in (var.sill,var.radius,var.nugget,var.power))
+
+		return (type(self).__name__,var,Cache.fingerprint(self._obs.points))
+
+	def estimate(self,est:Spatial,prop=None,memory:float=None,out:tuple=None,workers:int=None):
+		"""Returns the best estimated values and varitation for est data.
+
+		prop 	: (optional) property values at the observations, defaults to
+				  the observation property; (n,p) columns give (p,m) estimates
+				  sharing the same kriging weights
+		memory 	: (optional) memory budget in megabytes, the targets are then
+				  processed in chunks sized from it
+		out 	: (optional) preallocated (estimate,variance) arrays shaped like
+				  the returned ones, e.g. numpy.memmap instances, filled chunk
+				  by chunk
+		workers : (optional) number of processes kriging target blocks in
+				  parallel, see Parallel; the factorization is computed once
+				  and shared with them
+		"""
+		prop = self._obs.prop if prop is None else numpy.asarray(prop,dtype=float)
+
+		params = getattr(self._var,"shape",())
+
+		if out is None:
+			out = (numpy.empty(params+prop.shape[1:]+(est.size,)),numpy.empty(params+(est.size,)))
+
+		if workers is not None and workers>1:
+			return Parallel.run(self,est,prop,out,workers,memory=memory)
+
+		chunksize = est.size if memory is None else self.chunksize(memory)
 
-		sol = numpy.linalg.solve(
-			self._lefthandside(),
-			self._righthandside(est)
-			)
+		if chunksize>=est.size:
+			chunks = ((0,est),)
+		else:
+			points = est.points
+			chunks = ((start,Spatial(None,*points[start:start+chunksize].T))
+				for start in range(0,est.size,chunksize))
 
-		lamda,beta = sol[:-1,:],sol[-1,:]
+		for start,chunk in chunks:
 
-		pmat = lamda*self._obs.reshape((-1,1))
+			lamda,var = self.weights(chunk)
 
-		vmat = lamda*self.__crhs
+			out[0][...,start:start+chunk.size] = numpy.matmul(prop.T,lamda)
+			out[1][...,start:start+chunk.size] = var
 
-		est = pmat.sum(axis=0)
+		return out
 
-		var = self._var.sill-beta-vmat.sum(axis=0)
+	def chunksize(self,memory:float=512):
+		"""Returns the number of targets per chunk so that the temporaries of a
+		chunk, about six arrays of n values per target and parameter set, fit
+		in memory megabytes."""
 
-		return est,var
+		nbytes = 48*self._obs.size*int(numpy.prod(getattr(self._var,"shape",())))
 
-	def __call__(self,est:Spatial,frac=0.5):
+		return max(int(memory*2**20//nbytes),1)
+
+	def __call__(self,est:Spatial,frac=0.5,prop=None,memory:float=None,workers:int=None):
 		"""Returns percentile for the estimated values
-		If frac is 0.5, it returns the best estimate."""
+		If frac is 0.5, it returns the best estimate.
+		An array of fractions stacks the percentiles along leading axes,
+		all of them computed from a single solve."""
+
+		est,var = self.estimate(est,prop,memory,workers=workers)
+
+		return self.percentile(est,var,frac)
+
+	@staticmethod
+	def percentile(est,var,frac=0.5):
+		"""Returns the percentiles of the estimates for the fractions in frac,
+		stacked along leading axes for an array of fractions."""
+
+		if est.ndim>var.ndim:
+			var = numpy.expand_dims(var,-2)
+
+		quantile = norm.ppf(frac)
+
+		quantile = numpy.reshape(quantile,numpy.shape(quantile)+(1,)*est.ndim)
+
+		# variances at the observations may round to tiny negative values
+		return est+quantile*numpy.sqrt(numpy.maximum(var,0.))
+
+	def local(self,est:Spatial,search:Neighborhood,prop=None,blocksize:int=4096):
+		"""Returns the estimates and variances of moving neighborhood kriging, each
+		target is kriged from its own neighbors found by search. Targets with
+		fewer than search.mincount neighbors are nan.
+
+		prop 		: (optional) (n,) property values at the observations
+		blocksize 	: number of targets searched and solved per block, the
+					  neighbor arrays never exceed it; targets of a block with
+					  equal neighbor counts are solved in one batch
+		"""
+		if getattr(self._var,"shape",())!=():
+			raise ValueError("Moving neighborhood kriging takes a single variogram model.")
+
+		prop = self._obs.prop if prop is None else numpy.ravel(prop)
+
+		points = est.points
+
+		tree = search.tree(self._obs.points)
+
+		estimate = numpy.full(points.shape[0],numpy.nan)
+		variance = numpy.full(points.shape[0],numpy.nan)
+
+		for start in range(0,points.shape[0],blocksize):
+
+			block = points[start:start+blocksize]
+
+			index,counts = search.search(self._obs.points,block,tree)
+
+			for count in numpy.unique(counts[counts>=max(search.mincount,1)]):
+
+				rows = numpy.nonzero(counts==count)[0]
+
+				neighbors = index[rows,:count]
+
+				lamda,variance[start+rows] = self._localweights(block[rows],neighbors)
+
+				estimate[start+rows] = (lamda*prop[neighbors]).sum(axis=1)
+
+		return estimate,variance
+
+	def _localweights(self,targets,neighbors):
+		"""Returns the (g,c) kriging weights and (g,) variances of g targets with c
+		neighbors each, all g systems are solved in one batch."""
+
+		cmat,crhs = self._localcovs(targets,neighbors)
+
+		size = neighbors.shape[1]
+
+		lhs = numpy.ones((neighbors.shape[0],size+1,size+1))
+		rhs = numpy.ones((neighbors.shape[0],size+1,1))
+
+		lhs[:,:size,:size] = cmat
+		lhs[:,size,size] = 0
+
+		rhs[:,:size,0] = crhs
+
+		sol = numpy.linalg.solve(lhs,rhs)[...,0]
+
+		lamda,beta = sol[:,:size],sol[:,size]
+
+		return lamda,self._var.sill-beta-(lamda*crhs).sum(axis=1)
+
+	def _localcovs(self,targets,neighbors):
+		"""Returns the (g,c,c) neighbor covariance matrices and the (g,c) target
+		covariances of g targets with c neighbors each."""
+
+		points = self._obs.points[neighbors]
 
-		est,var = self.estimate(est)
+		dmat = numpy.sqrt(((points[:,:,numpy.newaxis]-points[:,numpy.newaxis])**2).sum(axis=-1))
+		drhs = numpy.sqrt(((points-targets[:,numpy.newaxis])**2).sum(axis=-1))
 
-		return est+norm.ppf(frac)*numpy.sqrt(var)
+		return self._var.sill-self._var(dmat),self._var.sill-self._var(drhs)
+
+	def weights(self,est:Spatial):
+		"""Returns the (n,m) kriging weights and the (m,) kriging variances of the
+		est locations, with the parameter shape of the variogram leading."""
+
+		crhs = self._righthandside(est)
+
+		lamda,beta = self._solve(crhs)
+
+		var = self._sill(1)-beta-(lamda*crhs).sum(axis=-2)
+
+		return lamda,var
 
 	def _distmat(self,est:Spatial=None):
 		"""Constructs distance matrix for est (m,) and obs (n,) data.
@@ -60,35 +226,145 @@ class Ordinary():
 
 	def _covmat(self,est:Spatial=None):
 		"""Constructs covariance matrix for est (m,) and obs (n,) data.
-		Returned matrix shape is (m,n)."""
-		return self._var.sill-self._varmat(est)
+		Returned matrix shape is (m,n). Models with a covariance method, e.g.
+		Theoretical, overwrite the distance matrix in place when they hold a
+		single parameter set."""
 
-	def _lefthandside(self):
-		"""Constructs the left-hand-side matrix for ordinary kriging calculations."""
+		if not hasattr(self._var,"covariance"):
+			return self._sill(2)-self._varmat(est)
 
-		cmat = self._covmat()
+		dmat = self._distmat(est)
 
-		cmat = self._colappend(cmat)
-		cmat = self._rowappend(cmat)
+		single = getattr(self._var,"shape",())==() and dmat.flags.c_contiguous and dmat.flags.writeable
 
-		cmat[-1,-1] = 0
+		return self._var.covariance(dmat,out=dmat if single else None)
 
-		return cmat
+	def _sill(self,ndim:int):
+		"""Returns the sill with ndim trailing axes to broadcast over matrices."""
+		return numpy.reshape(self._var.sill,numpy.shape(self._var.sill)+(1,)*ndim)
 
-	def _righthandside(self,est:Spatial):
-		"""Constructs the right-hand-side matrix for ordinary kriging calculations."""
+	def _factor(self):
+		"""Returns the factorization of the observation covariance matrix, it is
+		computed once per variogram model and observation set and cached."""
+		return self.cache.get(self.key,self._buildfactor)
+
+	def _buildfactor(self):
+		"""Returns the lower Cholesky factors of the observation covariance matrix
+		and the solutions of C@u = 1, with the parameter shape leading.
 
-		self.__crhs = self._covmat(est)
+		The ordinary kriging matrix [[C,1],[1,0]] is indefinite, so the
+		unbiasedness constraint is handled through u instead of factoring it.
+		The covariances of the power and de Wijs models, which have no sill,
+		are only conditionally positive-definite; for them, and whenever the
+		Cholesky factorization fails, the LU factors and pivots of the bordered
+		matrix are returned instead.
+
+		The factors are cached C-ordered, so the solves hand their transposes,
+		Fortran-ordered views, to LAPACK; the factors are never copied."""
+
+		cmat = self._covmat()
 
-		return self._rowappend(self.__crhs)
+		if getattr(self._var,"model",None) in ("powermodel","dewijs"):
+			return self._borderedfactor(cmat)
+
+		chol = numpy.empty(cmat.shape)
+		unit = numpy.empty(cmat.shape[:-1])
+
+		ones = numpy.ones(cmat.shape[-1])
+
+		try:
+			for index in numpy.ndindex(cmat.shape[:-2]):
+				chol[index] = cho_factor(cmat[index],lower=True)[0]
+				unit[index] = cho_solve((chol[index].T,False),ones,check_finite=False)
+		except numpy.linalg.LinAlgError:
+			return self._borderedfactor(cmat)
+
+		return chol,unit
 
 	@staticmethod
-	def _colappend(mat):
-		return numpy.append(mat,numpy.ones(mat.shape[0]).reshape((-1,1)),axis=1)
+	def _borderedfactor(cmat):
+		"""Returns the transposed LU factors and the pivots of the bordered ordinary
+		kriging matrices [[C,1],[1,0]], with the parameter shape leading."""
+
+		size = cmat.shape[-1]
+
+		lhs = numpy.ones(cmat.shape[:-2]+(size+1,size+1))
+
+		lhs[...,:size,:size] = cmat
+		lhs[...,size,size] = 0
+
+		pivs = numpy.empty(lhs.shape[:-1],dtype=numpy.int32)
+
+		for index in numpy.ndindex(cmat.shape[:-2]):
+			lu,pivs[index] = lu_factor(lhs[index])
+			lhs[index] = lu.T
+
+		return lhs,pivs
+
+	def _solve(self,crhs):
+		"""Returns the kriging weights and the Lagrange multipliers of the (n,m)
+		right-hand-side covariances from the cached factorization."""
+
+		factor,second = self._factor()
+
+		# the LU factors of the bordered matrix are one row larger than C
+		if factor.shape[-1]>crhs.shape[-2]:
+			return self._borderedsolve(factor,second,crhs)
+
+		chol,unit = factor,second
+
+		crhs = numpy.broadcast_to(crhs,chol.shape[:-2]+crhs.shape[-2:])
+
+		sol = numpy.empty(crhs.shape)
+
+		for index in numpy.ndindex(chol.shape[:-2]):
+			sol[index] = cho_solve((chol[index].T,False),crhs[index],check_finite=False)
+
+		# the multiplier enforcing weights summing to one
+		beta = (sol.sum(axis=-2)-1)/unit.sum(axis=-1,keepdims=True)
+
+		lamda = sol-numpy.expand_dims(beta,-2)*numpy.expand_dims(unit,-1)
+
+		return lamda,beta
 
 	@staticmethod
-	def _rowappend(mat):
-		return numpy.append(mat,numpy.ones(mat.shape[1]).reshape((1,-1)),axis=0)
+	def _borderedsolve(lu,pivs,crhs):
+		"""Returns the kriging weights and the Lagrange multipliers of the (n,m)
+		right-hand-side covariances from the transposed LU factors of the bordered
+		matrix."""
+
+		size = lu.shape[-1]-1
+
+		rhs = numpy.ones(lu.shape[:-2]+(size+1,crhs.shape[-1]))
+
+		rhs[...,:size,:] = crhs
+
+		for index in numpy.ndindex(lu.shape[:-2]):
+			rhs[index] = lu_solve((lu[index].T,pivs[index]),rhs[index],overwrite_b=True,check_finite=False)
+
+		return rhs[...,:size,:],rhs[...,size,:]
+
+	def _shared(self):
+		"""Returns the factorization arrays shared with the worker processes."""
+
+		factor,second = self._factor()
+
+		return {"factor":factor,"second":second}
+
+	@classmethod
+	def _restore(cls,var,arrays):
+		"""Returns the instance of a worker process around the shared arrays, its
+		cache is seeded with the shared factorization."""
+
+		krig = cls(Spatial(None,*arrays["obs"].T),var)
+
+		krig.cache.get(krig.key,lambda: (arrays["factor"],arrays["second"]))
+
+		return krig
+
+	def _righthandside(self,est:Spatial):
+		"""Constructs the (n,m) right-hand-side covariances for ordinary kriging."""
+		return numpy.swapaxes(self._covmat(est),-1,-2)
 
 if __name__ == "__main__":
 
@@ -0,0 +1,150 @@
+import math
+import mmap
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy
+
+from gmodel.utils._spatial import Spatial
+
+_worker = None # kriging instance and shared arrays of the worker processes
+
+class Parallel():
+	"""Kriging of target blocks over a process pool.
+
+	The observation and target coordinates, the property values and the
+	cached factorization of the kriging instance are placed in shared memory
+	once. The outputs are allocated empty in shared memory, or, for
+	numpy.memmap outputs, opened by filename in the workers. The workers attach
+	to all of them in the pool initializer, so a task is only the (start,stop)
+	range of a target block and its results are written straight into the
+	output.
+
+	The kriging class provides _shared, returning the dictionary of its
+	factorization arrays, and _restore, rebuilding an instance around them.
+	"""
+
+	@staticmethod
+	def run(krig,est:Spatial,prop,out:tuple,workers:int=None,blocksize:int=None,memory:float=None):
+		"""Fills the (estimate,variance) out arrays of krig at the est targets.
+
+		workers 	: number of worker processes, defaults to the cpu count
+		blocksize 	: number of targets per task, defaults to a quarter of the
+					  targets of a worker
+		memory 		: (optional) memory budget in megabytes of a worker chunk
+		"""
+		workers = os.cpu_count() if workers is None else workers
+
+		if blocksize is None:
+			blocksize = max(math.ceil(est.size/(4*workers)),1)
+
+		arrays = {
+			"obs" 		: krig._obs.points,
+			"est" 		: est.points,
+			"prop" 		: prop,
+			}
+
+		arrays.update(krig._shared())
+
+		outputs = {"estimate":out[0],"variance":out[1]}
+
+		blocks = [(start,min(start+blocksize,est.size)) for start in range(0,est.size,blocksize)]
+
+		memories,descriptors = {},{}
+
+		try:
+
+			for name,array in arrays.items():
+
+				array = numpy.ascontiguousarray(array)
+
+				memories[name],descriptors[name] = Parallel._create(array.shape,array.dtype)
+
+				Parallel._view(memories[name],descriptors[name])[...] = array
+
+			for name,array in outputs.items():
+
+				if Parallel._mapped(array):
+					descriptors[name] = (None,array.shape,array.dtype.str,array.filename,array.offset)
+				else:
+					memories[name],descriptors[name] = Parallel._create(array.shape,array.dtype)
+
+			initargs = (type(krig),krig._var,descriptors,memory)
+
+			with ProcessPoolExecutor(workers,initializer=Parallel._share,initargs=initargs) as pool:
+				list(pool.map(Parallel._task,blocks))
+
+			for name,array in outputs.items():
+				if name in memories:
+					array[...] = Parallel._view(memories[name],descriptors[name])
+
+		finally:
+
+			for shared in memories.values():
+				shared.close()
+				shared.unlink()
+
+		return out
+
+	@staticmethod
+	def _create(shape,dtype):
+		"""Returns a new shared memory block sized for the array and its descriptor."""
+
+		dtype = numpy.dtype(dtype)
+
+		shared = SharedMemory(create=True,size=max(math.prod(shape)*dtype.itemsize,1))
+
+		return shared,(shared.name,shape,dtype.str,None,0)
+
+	@staticmethod
+	def _mapped(array):
+		"""Returns whether the array is a whole C-contiguous numpy.memmap of a file,
+		which the workers can open themselves; views of a memmap are not."""
+		return (isinstance(array,numpy.memmap) and isinstance(array.base,mmap.mmap)
+			and array.filename is not None and array.flags.c_contiguous)
+
+	@staticmethod
+	def _view(shared,descriptor):
+		"""Returns the array of the descriptor over the shared memory block."""
+		return numpy.ndarray(descriptor[1],numpy.dtype(descriptor[2]),buffer=shared.buf)
+
+	@staticmethod
+	def _share(kind,var,descriptors,memory):
+
+		global _worker
+
+		memories,arrays = {},{}
+
+		for name,descriptor in descriptors.items():
+
+			shmname,shape,dtype,filename,offset = descriptor
+
+			if shmname is None:
+				arrays[name] = numpy.memmap(filename,numpy.dtype(dtype),"r+",offset,shape)
+			else:
+				memories[name] = SharedMemory(name=shmname)
+				arrays[name] = Parallel._view(memories[name],descriptor)
+
+		_worker = (kind._restore(var,arrays),arrays,memories,memory)
+
+	@staticmethod
+	def _task(block):
+
+		krig,arrays,memories,memory = _worker
+
+		start,stop = block
+
+		est = Spatial(None,*arrays["est"][start:stop].T)
+
+		out = (arrays["estimate"][...,start:stop],arrays["variance"][...,start:stop])
+
+		krig.estimate(est,arrays["prop"],memory,out)
+
+		for array in out:
+			if isinstance(array,numpy.memmap):
+				array.flush()
+
+		return stop-start
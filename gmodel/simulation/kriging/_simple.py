@@ -1,42 +1,142 @@
 import numpy
 
-from scipy.stats import norm
+from scipy.linalg import cho_factor
+from scipy.linalg import cho_solve
 
 from gmodel.utils._spatial import Spatial
 
-from gmodel.gstats._variogram import Variogram
-
-class Simple():
-
-    @staticmethod
-    def simple(obsdata:Spatial,estdata:Spatial,mean:float=None):
-
-        if mean is None:
-            self.mean = obsdata.mean()
-        else:
-            self.mean = mean
-        
-        "perc -> percentile, perc=0.5 gives mean values"
-
-        self.distance = estdata.distmat(obsdata)
-        
-        _,self.covariance = SpatProp.get_varmodel(
-            self.distance,self.obs.type,
-            self.obs.sill,self.obs.range,
-            self.obs.nugget)
-
-        self.lambdas = numpy.linalg.solve(self.obs.covariance,self.covariance)
-        
-        calc_diff_arr = self.obs.reshape((-1,1))-self.mean
-        calc_prop_mat = self.lambdas*(calc_diff_arr)
-        calc_vars_mat = self.lambdas*self.covariance
-        
-        estimate = self.mean+calc_prop_mat.sum(axis=0)
-        variance = self.obs.sill-calc_vars_mat.sum(axis=0)
-
-        return estimate,variance
-
-    @staticmethod
-    def percentile(estimate,variance,perc=0.5):
-        """perc -> percentile, perc=0.5 gives mean values"""
-        return estimate+norm.ppf(perc)*numpy.sqrt(variance)
\ No newline at end of file
+from gmodel.continuity._theoretical import Theoretical
+
+from gmodel.simulation.kriging._neighborhood import Neighborhood
+from gmodel.simulation.kriging._ordinary import Ordinary
+
+class Simple(Ordinary):
+	"""Simple kriging of the observation property about a known mean.
+
+	The observation covariance matrix is symmetric positive-definite, so its
+	Cholesky factors are cached and every target batch costs two triangular
+	solves. The estimate is the mean plus the kriged residuals. Chunking,
+	parallel blocks, parameter batches and moving neighborhoods work as in
+	Ordinary.
+	"""
+
+	def __init__(self,obs:Spatial,var:Theoretical,mean=None):
+		"""
+		obs 	: observation data
+		var 	: variogram model
+		mean 	: (optional) scalar mean, or (n,) locally varying mean at the
+				  observations; defaults to the mean of the observation property
+		"""
+		super().__init__(obs,var)
+
+		self.mean = numpy.mean(obs.prop) if mean is None else mean
+
+	def estimate(self,est:Spatial,prop=None,memory:float=None,out:tuple=None,workers:int=None,mean=None):
+		"""Returns the best estimated values and varitation for est data.
+
+		mean 	: (optional) (m,) mean at the est locations, required for a locally
+				  varying mean, defaults to the scalar mean otherwise
+
+		The remaining arguments are the same as in Ordinary.estimate.
+		"""
+		prop = self._obs.prop if prop is None else numpy.asarray(prop,dtype=float)
+
+		mean = self._targetmean(mean)
+
+		est,var = super().estimate(est,self._residual(prop),memory,out,workers)
+
+		est += mean
+
+		return est,var
+
+	def __call__(self,est:Spatial,frac=0.5,prop=None,memory:float=None,workers:int=None,mean=None):
+		"""Returns percentile for the estimated values
+		If frac is 0.5, it returns the best estimate."""
+
+		est,var = self.estimate(est,prop,memory,workers=workers,mean=mean)
+
+		return self.percentile(est,var,frac)
+
+	def local(self,est:Spatial,search:Neighborhood,prop=None,blocksize:int=4096,mean=None):
+		"""Returns the estimates and variances of moving neighborhood simple kriging,
+		the arguments are the same as in Ordinary.local and estimate."""
+
+		prop = self._obs.prop if prop is None else numpy.ravel(prop)
+
+		mean = self._targetmean(mean)
+
+		est,var = super().local(est,search,self._residual(prop),blocksize)
+
+		return est+mean,var
+
+	def _targetmean(self,mean):
+		"""Returns the mean at the targets."""
+
+		if mean is not None:
+			return numpy.asarray(mean,dtype=float)
+
+		if numpy.ndim(self.mean)>0:
+			raise ValueError("A locally varying mean needs the mean at the targets.")
+
+		return self.mean
+
+	def _residual(self,prop):
+		"""Returns the property residuals from the mean at the observations."""
+		return prop-numpy.reshape(self.mean,numpy.shape(self.mean)+(1,)*(prop.ndim-1))
+
+	def _buildfactor(self):
+		"""Returns the lower Cholesky factors of the observation covariance matrix,
+		with the parameter shape leading; they are solved through their
+		Fortran-ordered transposes, as in Ordinary."""
+
+		cmat = self._covmat()
+
+		chol = numpy.empty(cmat.shape)
+
+		for index in numpy.ndindex(cmat.shape[:-2]):
+			chol[index] = cho_factor(cmat[index],lower=True)[0]
+
+		return (chol,)
+
+	def _solve(self,crhs):
+		"""Returns the kriging weights of the (n,m) right-hand-side covariances
+		from the cached factorization, the Lagrange multipliers are zero."""
+
+		chol, = self._factor()
+
+		crhs = numpy.broadcast_to(crhs,chol.shape[:-2]+crhs.shape[-2:])
+
+		lamda = numpy.empty(crhs.shape)
+
+		for index in numpy.ndindex(chol.shape[:-2]):
+			lamda[index] = cho_solve((chol[index].T,False),crhs[index],check_finite=False)
+
+		return lamda,numpy.zeros(lamda.shape[:-2]+lamda.shape[-1:])
+
+	def _localweights(self,targets,neighbors):
+		"""Returns the (g,c) kriging weights and (g,) variances of g targets with c
+		neighbors each, all g systems are solved in one batch."""
+
+		cmat,crhs = self._localcovs(targets,neighbors)
+
+		lamda = numpy.linalg.solve(cmat,crhs[...,numpy.newaxis])[...,0]
+
+		return lamda,self._var.sill-(lamda*crhs).sum(axis=1)
+
+	def _shared(self):
+		"""Returns the factorization arrays shared with the worker processes."""
+
+		chol, = self._factor()
+
+		return {"chol":chol}
+
+	@classmethod
+	def _restore(cls,var,arrays):
+		"""Returns the instance of a worker process around the shared arrays, the
+		workers krige residuals, so their mean is zero."""
+
+		krig = cls(Spatial(None,*arrays["obs"].T),var,mean=0.)
+
+		krig.cache.get(krig.key,lambda: (arrays["chol"],))
+
+		return krig
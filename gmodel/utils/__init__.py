@@ -0,0 +1 @@
+from ._spatial import Spatial
@@ -0,0 +1,314 @@
+from functools import cached_property
+
+import numpy
+
+from scipy.spatial.distance import cdist
+from scipy.spatial.distance import pdist
+
+class Spatial():
+	"""Columnar container of property values at spatial locations.
+
+	Coordinates and properties are kept as contiguous rows, one per axis and one
+	per property column. The pair geometry is stored in condensed upper-triangle
+	form: one entry per pair (i,j) with i<j in the row-major order of
+	scipy.spatial.distance.pdist. It is computed on first access, cached and
+	invalidated whenever the coordinates or the active property change. The
+	square matrices are built from the condensed arrays only when requested.
+	"""
+
+	_geometry = ("distvec","azimvec","xdeltavec","ydeltavec","zdeltavec","bbox")
+
+	def __init__(self,prop,xaxis,yaxis=None,zaxis=None,dtype=numpy.float64,names=None):
+		"""
+		Parameters
+		----------
+		prop 	: property values, shape (n,) or (n,p) for several property
+				  columns; None for estimation locations
+		xaxis 	: x coordinates of the locations, shape (n,)
+		yaxis 	: (optional) y coordinates of the locations, shape (n,)
+		zaxis 	: (optional) z coordinates of the locations, shape (n,)
+
+		dtype 	: float type of the pair geometry, float32 halves its memory
+		names 	: (optional) names of the property columns
+
+		The first property column is the active one, see the select method.
+		"""
+		self._coords = numpy.empty((0,numpy.size(xaxis)))
+		self._axes = ()
+
+		self.xaxis = xaxis
+		self.yaxis = yaxis
+		self.zaxis = zaxis
+
+		self.props = numpy.empty((self.size,0)) if prop is None else prop
+
+		if names is not None:
+
+			if len(names)!=self._props.shape[0]:
+				raise ValueError(f"Expected {self._props.shape[0]} property names, got {len(names)}.")
+
+			self.names = tuple(names)
+
+		self.dtype = numpy.dtype(dtype)
+
+	@staticmethod
+	def read(path,xaxis:str,yaxis:str=None,zaxis:str=None,props:tuple[str]=None,delimiter:str="\t",dtype=numpy.float64):
+		"""Returns Spatial loaded from a delimited text file with a header line of
+		column names, e.g. the docs/*.txt tables. Leading comment lines starting
+		with '#' are skipped and the values are parsed in bulk by numpy.loadtxt.
+
+		xaxis,yaxis,zaxis 	: column names of the coordinates
+		props 				: (optional) column names of the properties, defaults
+							  to all columns other than the coordinates
+		"""
+		with open(path) as file:
+
+			for line in file:
+				if line.strip() and not line.lstrip().startswith("#"):
+					break
+
+			header = [name.strip().strip('"') for name in line.rstrip("\r\n").split(delimiter)]
+
+			table = numpy.loadtxt(file,delimiter=delimiter,comments="#",ndmin=2)
+
+		axes = [name for name in (xaxis,yaxis,zaxis) if name is not None]
+
+		props = [name for name in header if name not in axes] if props is None else list(props)
+
+		column = lambda name: None if name is None else table[:,header.index(name)]
+
+		values = table[:,[header.index(name) for name in props]]
+
+		return Spatial(values,column(xaxis),column(yaxis),column(zaxis),dtype=dtype,names=props)
+
+	def select(self,name):
+		"""Makes the property column with the given name (or index) the active one."""
+		self._column = self.names.index(name) if isinstance(name,str) else int(name)
+		self.__dict__.pop("deltavec",None)
+
+	@property
+	def size(self):
+		"""Returns the number of locations."""
+		return self._coords.shape[1]
+
+	@property
+	def prop(self):
+		"""Returns read-only values of the active property column."""
+		return None if self._props.shape[0]==0 else self._readonly(self._props[self._column])
+
+	@prop.setter
+	def prop(self,value):
+		"""Sets the values of the active property column."""
+		self._props[self._column] = self._column_array(value)
+		self.__dict__.pop("deltavec",None)
+
+	@property
+	def props(self):
+		"""Returns (n,p) read-only view of all property columns."""
+		return self._readonly(self._props.T)
+
+	@props.setter
+	def props(self,value):
+		"""Sets all property columns from (n,) or (n,p) values; the first column
+		becomes the active one and the names are kept only if their number
+		matches the new columns, default names are set otherwise."""
+		value = numpy.asarray(value,dtype=float)
+
+		if value.ndim==1:
+			value = value.reshape((-1,1))
+
+		if value.shape[0]!=self.size:
+			raise ValueError(f"Expected {self.size} property values, got {value.shape[0]}.")
+
+		self._props = numpy.ascontiguousarray(value.T)
+
+		self._column = 0
+
+		if len(getattr(self,"names",()))!=self._props.shape[0]:
+			self.names = tuple(f"prop{index}" for index in range(self._props.shape[0]))
+
+		self.__dict__.pop("deltavec",None)
+
+	@property
+	def xaxis(self):
+		"""Returns the x coordinates."""
+		return self._axis("x")
+
+	@xaxis.setter
+	def xaxis(self,value):
+		"""Sets the x coordinates and invalidates the pair geometry."""
+		self._set_axis("x",value)
+
+	@property
+	def yaxis(self):
+		"""Returns the y coordinates, None if the data has no y axis."""
+		return self._axis("y")
+
+	@yaxis.setter
+	def yaxis(self,value):
+		"""Sets the y coordinates and invalidates the pair geometry."""
+		self._set_axis("y",value)
+
+	@property
+	def zaxis(self):
+		"""Returns the z coordinates, None if the data has no z axis."""
+		return self._axis("z")
+
+	@zaxis.setter
+	def zaxis(self,value):
+		"""Sets the z coordinates and invalidates the pair geometry."""
+		self._set_axis("z",value)
+
+	def _axis(self,name):
+		return self._readonly(self._coords[self._axes.index(name)]) if name in self._axes else None
+
+	def _set_axis(self,name,value):
+
+		rows = {axis:self._coords[index] for index,axis in enumerate(self._axes)}
+
+		if value is None:
+			rows.pop(name,None)
+		else:
+			rows[name] = self._column_array(value)
+
+		self._axes = tuple(axis for axis in "xyz" if axis in rows)
+
+		self._coords = numpy.array([rows[axis] for axis in self._axes])
+
+		for key in self._geometry+("deltavec",):
+			self.__dict__.pop(key,None)
+
+	@staticmethod
+	def _readonly(array):
+		"""Returns read-only view of the array, so that the data only changes
+		through the setters that invalidate the cached pair geometry."""
+
+		view = array.view()
+
+		view.flags.writeable = False
+
+		return view
+
+	def _column_array(self,value):
+
+		value = numpy.ravel(value).astype(float)
+
+		if self._coords.shape[1]!=value.size:
+			raise ValueError(f"Expected {self._coords.shape[1]} values, got {value.size}.")
+
+		return value
+
+	@property
+	def points(self):
+		"""Returns (n,d) read-only coordinate array of the available axes."""
+		return self._readonly(self._coords.T)
+
+	@cached_property
+	def bbox(self):
+		"""Returns (2,d) array of the minimum and maximum coordinates."""
+		return numpy.array([self._coords.min(axis=1),self._coords.max(axis=1)])
+
+	@property
+	def offsets(self):
+		"""Returns the condensed position of the first pair of each row, shape (n,)."""
+		index = numpy.arange(self.size)
+		return index*self.size-index*(index+1)//2
+
+	def unravel(self,position):
+		"""Returns the (first,second) location indices of condensed pair positions."""
+		offsets = self.offsets
+		first = numpy.searchsorted(offsets,position,side='right')-1
+		return first,position-offsets[first]+first+1
+
+	def get_distmat(self,other):
+		"""Returns (m,n) distance matrix between the m locations of this data
+		and the n locations of the other data."""
+		return cdist(self.points,other.points).astype(self.dtype,copy=False)
+
+	@cached_property
+	def distvec(self):
+		"""Returns the condensed pair distances."""
+		return pdist(self.points).astype(self.dtype,copy=False)
+
+	@cached_property
+	def azimvec(self):
+		"""Returns the condensed pair azimuths measured from +x counterclockwise,
+		the pair (i,j) points from location i to location j."""
+		ydelta = numpy.zeros(1,dtype=self.dtype) if self.yaxis is None else self.ydeltavec
+		return numpy.arctan2(ydelta,self.xdeltavec).astype(self.dtype,copy=False)
+
+	@cached_property
+	def deltavec(self):
+		"""Returns the condensed property differences, prop[j]-prop[i]."""
+		return self.condense(self.prop)
+
+	@cached_property
+	def xdeltavec(self):
+		"""Returns the condensed x separations, xaxis[j]-xaxis[i]."""
+		return self.condense(self.xaxis)
+
+	@cached_property
+	def ydeltavec(self):
+		"""Returns the condensed y separations, yaxis[j]-yaxis[i]."""
+		return None if self.yaxis is None else self.condense(self.yaxis)
+
+	@cached_property
+	def zdeltavec(self):
+		"""Returns the condensed z separations, zaxis[j]-zaxis[i]."""
+		return None if self.zaxis is None else self.condense(self.zaxis)
+
+	def condense(self,values):
+		"""Returns the condensed differences values[j]-values[i] of all pairs."""
+		offsets = numpy.append(self.offsets,self.size*(self.size-1)//2)
+
+		condensed = numpy.empty(offsets[-1],dtype=self.dtype)
+
+		for index in range(self.size-1):
+			condensed[offsets[index]:offsets[index+1]] = values[index+1:]-values[index]
+
+		return condensed
+
+	def square(self,condensed,antisymmetric=False):
+		"""Returns the (n,n) matrix view of condensed pair values. For antisymmetric
+		quantities the lower triangle holds the negated values."""
+		matrix = numpy.zeros((self.size,self.size),dtype=self.dtype)
+
+		upper = numpy.triu_indices(self.size,1)
+
+		matrix[upper] = condensed
+		matrix[upper[::-1]] = -condensed if antisymmetric else condensed
+
+		return matrix
+
+	@property
+	def distmat(self):
+		"""Returns the (n,n) distance matrix."""
+		return self.square(self.distvec)
+
+	@property
+	def azimmat(self):
+		"""Returns the (n,n) azimuth matrix, azimmat[i,j] points from i to j."""
+		matrix = self.square(self.azimvec)
+		lower = numpy.tril_indices(self.size,-1)
+		matrix[lower] = numpy.where(matrix[lower]>0,matrix[lower]-numpy.pi,matrix[lower]+numpy.pi)
+		return matrix
+
+	@property
+	def delta(self):
+		"""Returns the (n,n) property difference matrix, delta[i,j] = prop[j]-prop[i]."""
+		return self.square(self.deltavec,antisymmetric=True)
+
+	@property
+	def xdelta(self):
+		"""Returns the (n,n) x separation matrix."""
+		return self.square(self.xdeltavec,antisymmetric=True)
+
+	@property
+	def ydelta(self):
+		"""Returns the (n,n) y separation matrix."""
+		return None if self.yaxis is None else self.square(self.ydeltavec,antisymmetric=True)
+
+	@property
+	def zdelta(self):
+		"""Returns the (n,n) z separation matrix."""
+		return None if self.zaxis is None else self.square(self.zdeltavec,antisymmetric=True)
@@ -6,6 +6,7 @@ setup(
 	packages = find_packages(),
 	install_requires = [
 		'numpy>=1.26.4',
+		'scipy',
 		],
 	)
 
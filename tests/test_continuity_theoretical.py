@@ -0,0 +1,252 @@
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from gmodel.continuity import Fitting
+from gmodel.continuity import Lookup
+from gmodel.continuity import Nested
+from gmodel.continuity import Structure
+from gmodel.continuity import Theoretical
+
+class TestFitting(unittest.TestCase):
+
+    def setUp(self):
+
+        self.bins = np.arange(25.,501.,25.)
+        self.nums = np.linspace(400,100,self.bins.size)
+
+    def test_recovers_model(self):
+
+        for model in ("spherical","exponential","gaussian","cauchy"):
+
+            theory = Theoretical(model,sill=2.,radius=240.,nugget=0.3)
+
+            fitted,misfit = Fitting.model(model,theory(self.bins),self.bins,self.nums)
+
+            self.assertAlmostEqual(fitted.radius,240.,delta=2.4)
+            self.assertAlmostEqual(fitted.sill,2.,delta=0.02)
+            self.assertAlmostEqual(fitted.nugget,0.3,delta=0.02)
+
+            self.assertLess(misfit,1e-4)
+
+    def test_ranking(self):
+
+        gamma = Theoretical("exponential",sill=1.5,radius=300.,nugget=0.1)(self.bins)
+
+        gamma[3] = np.nan
+
+        results = Fitting.fit(gamma,self.bins,self.nums)
+
+        self.assertEqual(len(results),len(Fitting.models))
+
+        self.assertEqual(results[0][0].model,"exponential")
+
+        misfits = [misfit for theory,misfit in results]
+
+        self.assertEqual(misfits,sorted(misfits))
+
+        for theory,misfit in results:
+            self.assertGreaterEqual(theory.nugget,0.)
+            self.assertGreaterEqual(theory.sill,theory.nugget)
+
+    def test_power(self):
+
+        theory = Theoretical("powermodel",sill=0.21,nugget=0.2,power=1.4)
+
+        fitted,misfit = Fitting.model("powermodel",theory(self.bins),self.bins,self.nums)
+
+        self.assertAlmostEqual(fitted.power,1.4,delta=0.01)
+
+class TestInPlace(unittest.TestCase):
+
+    def setUp(self):
+
+        self.bins = np.random.default_rng(5).uniform(0,1500,(300,200))
+
+        self.bins[0,:3] = 0.
+
+    def test_blocks(self):
+
+        for model in ("spherical","exponential","gaussian","holeeffect","cubic","cauchy","powermodel","dewijs"):
+
+            theory = Theoretical(model,sill=2.,radius=500.,nugget=0.3,power=1.3)
+
+            full = theory(self.bins,blocksize=self.bins.size)
+
+            np.testing.assert_allclose(theory(self.bins,blocksize=1001),full)
+
+            out = np.empty_like(self.bins)
+
+            self.assertIs(theory(self.bins,out=out),out)
+
+            np.testing.assert_allclose(out,full)
+
+            self.assertTrue(np.all(full[0,:3]==0))
+
+    def test_covariance_in_place(self):
+
+        theory = Theoretical("exponential",sill=2.,radius=500.,nugget=0.3)
+
+        expected = theory.sill-theory(self.bins)
+
+        single = self.bins.astype(np.float32)
+
+        tracemalloc.start()
+
+        result = theory.covariance(single,out=single,blocksize=4096)
+
+        peak = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.stop()
+
+        self.assertIs(result,single)
+        self.assertEqual(result.dtype,np.float32)
+
+        self.assertLess(peak,single.nbytes/4)
+
+        np.testing.assert_allclose(result,expected,rtol=1e-5,atol=1e-6)
+
+class TestLookup(unittest.TestCase):
+
+    def setUp(self):
+
+        self.bins = np.random.default_rng(9).uniform(0,3000,(200,150))
+
+        self.bins[0,:3] = 0.
+
+    def test_error_bound(self):
+
+        for model in ("spherical","exponential","gaussian","cubic","cauchy","holeeffect"):
+
+            theory = Theoretical(model,sill=2.,radius=500.,nugget=0.3)
+
+            lookup = Lookup(theory,error=1e-5)
+
+            self.assertLessEqual(lookup.error,2e-5)
+
+            np.testing.assert_allclose(lookup(self.bins,blocksize=999),theory(self.bins),rtol=0,atol=2e-5)
+
+            self.assertTrue(np.all(lookup(self.bins)[0,:3]==0))
+
+    def test_cache_and_in_place(self):
+
+        theory = Theoretical("exponential",sill=2.,radius=500.)
+
+        self.assertIs(Lookup.cached(theory),Lookup.cached(Theoretical("exponential",sill=2.,radius=500.)))
+
+        single = self.bins.astype(np.float32)
+
+        expected = theory.covariance(self.bins)
+
+        self.assertIs(Lookup.cached(theory).covariance(single,out=single),single)
+
+        np.testing.assert_allclose(single,expected,rtol=0,atol=1e-5)
+
+        theory = Theoretical("spherical",sill=2.,radius=500.,nugget=0.3)
+
+        double = self.bins.copy()
+
+        expected = Lookup.cached(theory)(self.bins)
+
+        self.assertIs(Lookup.cached(theory)(double,out=double,blocksize=999),double)
+
+        np.testing.assert_array_equal(double,expected)
+
+    def test_extent(self):
+
+        with self.assertRaises(ValueError):
+            Lookup(Theoretical("powermodel",sill=1.,power=1.5))
+
+        theory = Theoretical("powermodel",sill=1.,power=1.5)
+
+        lookup = Lookup(theory,extent=1000.)
+
+        np.testing.assert_allclose(lookup(self.bins),theory(self.bins),rtol=1e-6)
+
+    def test_single_model(self):
+
+        theory = Theoretical("exponential",sill=np.array([1.,2.]),radius=10.)
+
+        with self.assertRaises(ValueError):
+            Lookup(theory)
+
+        with self.assertRaises(ValueError):
+            Lookup.cached(theory)
+
+        lookup = Lookup(theory.select(1))
+
+        np.testing.assert_allclose(lookup(self.bins),theory(self.bins)[1],rtol=0,atol=5e-6)
+
+class TestNested(unittest.TestCase):
+
+    def setUp(self):
+
+        self.bins = np.random.default_rng(3).uniform(0,900,(40,30))
+
+        self.bins[0,:5] = 0.
+
+    def test_single_structure(self):
+
+        nested = Nested(0.2,(Structure("spherical",contrib=0.8,radius=400.),))
+
+        theory = Theoretical("spherical",sill=1.,radius=400.,nugget=0.2)
+
+        np.testing.assert_allclose(nested(self.bins),theory(self.bins))
+
+    def test_sum_of_structures(self):
+
+        first = Structure("exponential",contrib=0.5,radius=150.)
+        second = Structure("gaussian",contrib=1.,radius=700.)
+
+        nested = Nested(0.1,(first,second))
+
+        expected = (Theoretical("exponential",sill=0.5,radius=150.)(self.bins)
+            +Theoretical("gaussian",sill=1.,radius=700.)(self.bins)+0.1*(self.bins>0))
+
+        np.testing.assert_allclose(nested(self.bins,blocksize=77),expected)
+
+        self.assertAlmostEqual(nested.sill,1.6)
+
+        np.testing.assert_allclose(nested.covariance(self.bins),1.6-expected)
+
+        inplace = self.bins.copy()
+
+        self.assertIs(nested(inplace,out=inplace,blocksize=100),inplace)
+
+        np.testing.assert_allclose(inplace,expected)
+
+    def test_anisotropy(self):
+
+        structure = Structure("spherical",contrib=1.,radius=600.,minor=200.,vertical=50.,azimuth=30.)
+
+        nested = Nested(0.,(structure,))
+
+        theory = Theoretical("spherical",sill=1.,radius=1.)
+
+        angle = np.radians(30.)
+
+        major = np.array([np.cos(angle),np.sin(angle),0.])
+        minor = np.array([-np.sin(angle),np.cos(angle),0.])
+
+        distance = np.linspace(0,700,15)
+
+        vector = np.concatenate([distance[:,None]*major,distance[:,None]*minor,distance[:,None]*[0,0,1.]])
+
+        expected = np.concatenate([theory(distance/600.),theory(distance/200.),theory(distance/50.)])
+
+        np.testing.assert_allclose(nested.vector(vector,blocksize=7),expected,atol=1e-12)
+
+        np.testing.assert_allclose(nested.vector(vector[:15,:2]),expected[:15],atol=1e-12)
+
+    def test_unscaled_models(self):
+
+        for model in ("powermodel","dewijs"):
+            with self.assertRaises(ValueError):
+                Structure(model,contrib=1.)
+
+        with self.assertRaises(ValueError):
+            Structure("spherical",contrib=1.)
+
+if __name__ == "__main__":
+    unittest.main()
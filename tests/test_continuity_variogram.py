@@ -0,0 +1,477 @@
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from gmodel.continuity import Accumulator
+from gmodel.continuity import Experimental
+from gmodel.continuity import GridVariogram
+from gmodel.continuity import PairIndex
+from gmodel.continuity import Variogram
+
+from gmodel.utils import Spatial
+
+def bruteforce(data,exp):
+    """Reference lag loop with one mask per lag, self pairs excluded."""
+    abool = Variogram.azimbool(data,exp)
+    abool = np.logical_and(abool,~np.eye(data.distmat.shape[0],dtype=bool))
+    hbins = Variogram.bins(exp)
+
+    gamma = np.zeros_like(hbins)
+
+    for i,h in enumerate(hbins):
+
+        cbool = np.logical_and(np.abs(data.distmat-h)<=exp.lagtol,abool)
+
+        N = np.count_nonzero(cbool)
+
+        gamma[i] = np.nan if N==0 else (data.delta[cbool]**2).sum()/(2*N)
+
+    return gamma,hbins
+
+class TestExperimental(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(7)
+
+        self.data = Spatial(rng.normal(size=200),
+            rng.uniform(0,1000,200),rng.uniform(0,1000,200))
+
+    def test_single_sweep_matches_lag_loop(self):
+
+        for exp in (
+            Experimental(lagdist=50,lagtol=25,outbound=600),
+            Experimental(lagdist=50,lagtol=80,outbound=600),
+            Experimental(lagdist=40,lagtol=10,outbound=500,azimuth=45,azimtol=22.5,bdwidth=200),
+            ):
+
+            gamma,hbins = Variogram.experimental(self.data,exp)
+
+            refgamma,refbins = bruteforce(self.data,exp)
+
+            np.testing.assert_array_equal(hbins,refbins)
+            np.testing.assert_allclose(gamma,refgamma)
+
+    def test_tree_matches_dense(self):
+
+        for exp in (
+            Experimental(lagdist=50,lagtol=25,outbound=300),
+            Experimental(lagdist=40,lagtol=10,outbound=500,azimuth=45,azimtol=22.5,bdwidth=200),
+            Experimental(lagdist=40,lagtol=20,outbound=400,azimuth=-90,azimtol=30),
+            ):
+
+            gamma,_ = Variogram.experimental(self.data,exp,method="tree")
+
+            np.testing.assert_allclose(gamma,Variogram.experimental(self.data,exp)[0])
+
+    def test_stream_matches_dense(self):
+
+        exp = Experimental(lagdist=40,lagtol=10,outbound=500,azimuth=45,azimtol=22.5,bdwidth=200)
+
+        dense,_ = Variogram.experimental(self.data,exp)
+
+        for blocksize in (1,7,500):
+            gamma,_ = Variogram.experimental(self.data,exp,method="stream",blocksize=blocksize)
+            np.testing.assert_allclose(gamma,dense)
+
+        gamma,_ = Variogram.experimental(self.data,exp,method="stream",memory=0.1)
+        np.testing.assert_allclose(gamma,dense)
+
+    def test_dense_memory(self):
+
+        rng = np.random.default_rng(11)
+
+        data = Spatial(rng.normal(size=1500),rng.uniform(0,1000,1500),rng.uniform(0,1000,1500))
+
+        exp = Experimental(lagdist=50,lagtol=25,outbound=600,azimuth=30,azimtol=22.5)
+
+        tracemalloc.start()
+
+        Variogram.experimental(data,exp)
+
+        kept,peak = tracemalloc.get_traced_memory()
+
+        tracemalloc.stop()
+
+        nbytes = data.distvec.nbytes
+
+        # only the condensed distances stay cached
+        self.assertNotIn("xdeltavec",data.__dict__)
+
+        self.assertLess(kept,1.5*nbytes)
+
+        # the distances and their float64 source plus a single block of pairs
+        self.assertLess(peak,2*nbytes+2**25)
+
+    def test_stream_memory_budget(self):
+
+        rng = np.random.default_rng(11)
+
+        data = Spatial(rng.normal(size=3000),rng.uniform(0,1000,3000),rng.uniform(0,1000,3000))
+
+        exp = Experimental(lagdist=50,lagtol=25,outbound=1500)
+
+        tracemalloc.start()
+
+        Variogram.experimental(data,exp,method="stream",memory=4)
+
+        peak = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.stop()
+
+        self.assertLess(peak,4*2**20)
+
+    def test_tree_memory_budget(self):
+
+        rng = np.random.default_rng(11)
+
+        data = Spatial(rng.normal(size=4000),rng.uniform(0,1e4,4000),rng.uniform(0,1e4,4000))
+
+        exp = Experimental(lagdist=250,lagtol=125,outbound=2500)
+
+        tracemalloc.start()
+
+        gamma,_ = Variogram.experimental(data,exp,method="tree",memory=4)
+
+        peak = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.stop()
+
+        self.assertLess(peak,4*2**20)
+
+        np.testing.assert_allclose(gamma,Variogram.experimental(data,exp,method="stream",memory=4)[0])
+
+    def test_stream_memory_directions(self):
+
+        rng = np.random.default_rng(11)
+
+        data = Spatial(rng.normal(size=2000),rng.uniform(0,1000,2000),rng.uniform(0,1000,2000))
+
+        exp = Experimental(lagdist=50,lagtol=25,outbound=1500)
+
+        props = rng.normal(size=(2000,4))
+
+        for compute in (
+            lambda: Variogram.directional(data,Variogram.rose(exp,18),method="stream",memory=4),
+            lambda: Variogram.cross(data,exp,props,method="stream",memory=4),
+            ):
+
+            tracemalloc.start()
+
+            compute()
+
+            peak = tracemalloc.get_traced_memory()[1]
+
+            tracemalloc.stop()
+
+            self.assertLess(peak,4*2**20)
+
+    def test_rose_matches_single_directions(self):
+
+        exps = Variogram.rose(Experimental(lagdist=50,lagtol=25,outbound=400,bdwidth=300),6)
+
+        for method in ("dense","tree","stream"):
+
+            gamma,hbins = Variogram.directional(self.data,exps,method=method)
+
+            self.assertEqual(gamma.shape,(6,hbins.size))
+
+            for row,exp in zip(gamma,exps):
+                np.testing.assert_allclose(row,bruteforce(self.data,exp)[0])
+
+    def test_vertical_direction(self):
+
+        rng = np.random.default_rng(11)
+
+        x,y,z = rng.uniform(0,100,150),rng.uniform(0,100,150),rng.uniform(0,60,150)
+
+        data = Spatial(rng.normal(size=150),x,y,z)
+
+        exp = Experimental(lagdist=5,lagtol=2.5,outbound=30,dip=90,azimtol=15,diptol=15,vbdwidth=20)
+
+        dx,dy,dz = np.abs(data.xdelta),np.abs(data.ydelta),np.abs(data.zdelta)
+
+        # horizontal projection around the azimuth, inclination around the dip
+        inside = dy<=dx*np.tan(np.radians(15))
+        inside &= np.hypot(dx,dy)<=dz*np.tan(np.radians(15))
+        inside &= np.hypot(dx,dy)<=10
+
+        np.testing.assert_array_equal(Variogram.azimbool(data,exp),inside)
+
+        dense,_ = Variogram.experimental(data,exp)
+
+        for method in ("tree","stream"):
+            np.testing.assert_allclose(Variogram.experimental(data,exp,method=method)[0],dense)
+
+    def test_dip_cone(self):
+
+        data = Spatial(np.array([0.,1.,0.,3.]),np.array([0.,0.,100.,100.]),np.array([0.,0.,0.,10.]),np.array([0.,10.,0.,0.]))
+
+        exp = Experimental(lagdist=10,lagtol=5,outbound=10,dip=90,diptol=10)
+
+        # only the vertical pair is inside, the horizontal y pair is not
+        for method in ("dense","tree","stream"):
+            np.testing.assert_allclose(Variogram.experimental(data,exp,method=method)[0],[0.5])
+
+        rng = np.random.default_rng(5)
+
+        data = Spatial(rng.normal(size=120),*rng.uniform(0,100,(3,120)))
+
+        exp = Experimental(lagdist=10,lagtol=5,outbound=60,azimuth=40,dip=35,diptol=20)
+
+        # inclination of the pairs, oriented towards the azimuth, within diptol of the dip
+        horizontal = data.xdelta*np.cos(np.radians(40))+data.ydelta*np.sin(np.radians(40))
+
+        elevation = np.degrees(np.arctan2(np.sign(horizontal)*data.zdelta,np.hypot(data.xdelta,data.ydelta)))
+
+        distinct = ~np.eye(data.size,dtype=bool)
+
+        np.testing.assert_array_equal(Variogram.azimbool(data,exp)[distinct],(np.abs(elevation-35)<=20)[distinct])
+
+    def test_cross_variograms(self):
+
+        rng = np.random.default_rng(13)
+
+        props = rng.normal(size=(200,3))
+        props[:,1] += props[:,0]
+
+        exp = Experimental(lagdist=50,lagtol=25,outbound=400,azimuth=30,azimtol=45)
+
+        gamma,hbins = Variogram.cross(self.data,exp,props)
+
+        self.assertEqual(gamma.shape,(3,3,hbins.size))
+
+        np.testing.assert_array_equal(gamma,gamma.transpose((1,0,2)))
+
+        for index in range(3):
+            data = Spatial(props[:,index],self.data.xaxis,self.data.yaxis)
+            np.testing.assert_allclose(gamma[index,index],Variogram.experimental(data,exp)[0])
+
+        dist = np.triu(self.data.distmat)
+        inside = np.logical_and(Variogram.azimbool(self.data,exp),dist>0)
+
+        da = props[:,0]-props[:,0].reshape((-1,1))
+        db = props[:,1]-props[:,1].reshape((-1,1))
+
+        for k,h in enumerate(hbins):
+            cbool = np.logical_and(np.abs(dist-h)<=exp.lagtol,inside)
+            self.assertAlmostEqual(gamma[0,1,k],(da*db)[cbool].sum()/(2*cbool.sum()))
+
+        np.testing.assert_allclose(Variogram.cross(self.data,exp,props,method="stream",blocksize=13)[0],gamma)
+
+        data = Spatial(props,self.data.xaxis,self.data.yaxis)
+
+        np.testing.assert_allclose(Variogram.cross(data,exp)[0],gamma)
+
+    def test_robust_estimators(self):
+
+        exp = Experimental(lagdist=50,lagtol=25,outbound=400,azimuth=60,azimtol=30)
+
+        result,hbins = Variogram.estimators(self.data,exp,resolution=4096)
+
+        dist = np.triu(self.data.distmat)
+        inside = np.logical_and(Variogram.azimbool(self.data,exp),dist>0)
+
+        width = np.ptp(self.data.prop)/4096
+
+        for k,h in enumerate(hbins):
+
+            cbool = np.logical_and(np.abs(dist-h)<=exp.lagtol,inside)
+
+            diff = np.abs(self.data.delta[cbool])
+            nums = diff.size
+
+            self.assertEqual(result["nums"][k],nums)
+            self.assertAlmostEqual(result["lagmean"][k],dist[cbool].mean())
+            self.assertAlmostEqual(result["classical"][k],(diff**2).mean()/2)
+            self.assertAlmostEqual(result["madogram"][k],diff.mean()/2)
+            self.assertAlmostEqual(result["cressie"][k],np.sqrt(diff).mean()**4/(2*(0.457+0.494/nums)))
+
+            median = np.sqrt(result["dowd"][k]/1.099)
+            ordered = np.sort(diff)
+
+            self.assertGreaterEqual(median,ordered[(nums-1)//2]-width)
+            self.assertLessEqual(median,ordered[nums//2]+width)
+
+        stream,_ = Variogram.estimators(self.data,exp,method="stream",blocksize=9,resolution=4096)
+
+        for key in result:
+            np.testing.assert_allclose(stream[key],result[key])
+
+    def test_bootstrap_bands(self):
+
+        exp = Experimental(lagdist=50,lagtol=25,outbound=400)
+
+        bands,hbins = Variogram.bootstrap(self.data,exp,replicates=40,seed=1,workers=1)
+
+        self.assertEqual(bands.shape,(3,hbins.size))
+        self.assertTrue(np.all(bands[0]<=bands[1]) and np.all(bands[1]<=bands[2]))
+
+        pooled,_ = Variogram.bootstrap(self.data,exp,replicates=40,seed=1,workers=2,method="tree")
+
+        np.testing.assert_allclose(pooled,bands)
+
+        blocked,_ = Variogram.bootstrap(self.data,exp,replicates=40,seed=1,cellsize=250,workers=1)
+
+        self.assertEqual(blocked.shape,bands.shape)
+
+    def test_jackknife_bands(self):
+
+        exp = Experimental(lagdist=50,lagtol=25,outbound=400)
+
+        bands,_ = Variogram.bootstrap(self.data,exp,percentiles=(16,50,84),mode="jackknife",workers=1)
+
+        np.testing.assert_allclose(bands[1],Variogram.experimental(self.data,exp)[0])
+
+        self.assertTrue(np.all(bands[0]<bands[2]))
+
+    def test_accumulator_updates(self):
+
+        exps = Variogram.rose(Experimental(lagdist=50,lagtol=25,outbound=400),3)
+
+        points = np.column_stack((self.data.xaxis,self.data.yaxis))
+
+        acc = Accumulator(exps,points[:150],self.data.prop[:150])
+
+        well = acc.append(points[150:],self.data.prop[150:])
+
+        np.testing.assert_allclose(acc.gamma,Variogram.directional(self.data,exps)[0])
+
+        acc.remove(well[:30])
+
+        self.assertEqual(acc.size,170)
+
+        subset = np.r_[0:150,180:200]
+
+        data = Spatial(self.data.prop[subset],self.data.xaxis[subset],self.data.yaxis[subset])
+
+        gamma,_ = Variogram.directional(data,exps)
+
+        np.testing.assert_allclose(acc.gamma,gamma)
+        self.assertEqual(acc.nums.shape,(3,acc.bins.size))
+
+    def test_pair_index_sweep(self):
+
+        index = PairIndex(self.data)
+
+        self.assertEqual(index.size,200*199//2)
+
+        for lagdist in (20,35,50):
+            for lagtol in (lagdist/4,lagdist/2,lagdist):
+                for azimtol in (90,30):
+
+                    exp = Experimental(lagdist=lagdist,lagtol=lagtol,outbound=400,azimuth=60,azimtol=azimtol)
+
+                    np.testing.assert_allclose(index.experimental(exp)[0],
+                        Variogram.experimental(self.data,exp)[0],rtol=1e-9)
+
+        limited = PairIndex(self.data,radius=300)
+
+        exp = Experimental(lagdist=50,lagtol=25,outbound=250)
+
+        np.testing.assert_allclose(limited.experimental(exp)[0],index.experimental(exp)[0],rtol=1e-9)
+
+        with self.assertRaises(ValueError):
+            limited.experimental(Experimental(lagdist=50,lagtol=25,outbound=300))
+
+        # the omnidirectional count prefix is built once
+        self.assertIs(index.prefix(exp)[1],index.prefix(exp)[1])
+
+    def test_automatic_lags(self):
+
+        index = PairIndex(self.data)
+
+        exp = Variogram.automatic(self.data,index=index,mincount=20)
+
+        nums = Variogram.estimators(self.data,exp)[0]["nums"]
+
+        self.assertTrue(nums.min()>=20)
+
+        # the picked setting scores no worse than any setting it was compared with
+        lagdist = np.array([exp.lagdist,exp.outbound/10,exp.outbound/20])
+
+        scores = index.scores(lagdist,lagdist/2,exp.outbound,mincount=20)
+
+        best = index.scores(exp.lagdist,exp.lagtol,exp.outbound,mincount=20)[0]
+
+        self.assertTrue(np.all(best<=scores+1e-12))
+
+        self.assertTrue(np.isinf(index.scores(10.,5.,900.,mincount=10**6)[0]))
+
+        # candidates are clipped to the radius of a limited index
+        limited = Variogram.automatic(self.data,index=PairIndex(self.data,radius=300.),mincount=20)
+
+        self.assertLessEqual(limited.outbound+limited.lagtol,300.)
+
+        self.assertEqual(Variogram.automatic(self.data,radius=300.,mincount=20),limited)
+
+    def test_grid_ties(self):
+
+        x,y = np.meshgrid(np.arange(4)*10.,np.arange(4)*10.)
+
+        z = np.array([32,28,12,18,24,20,16,12,20,17,10,7,10,12,9,8],dtype=float)
+
+        data = Spatial(z,x.ravel(),y.ravel())
+
+        exp = Experimental(lagdist=20,lagtol=10,outbound=40)
+
+        gamma,_ = Variogram.experimental(data,exp)
+
+        np.testing.assert_allclose(gamma,bruteforce(data,exp)[0])
+
+class TestGridVariogram(unittest.TestCase):
+
+    def test_map_matches_pairwise(self):
+
+        rng = np.random.default_rng(3)
+
+        z = rng.normal(size=(6,8))
+        z[1,2] = np.nan
+
+        mask = np.ones(z.shape,dtype=bool)
+        mask[4,5:] = False
+
+        gamma,nums = GridVariogram.lagmap(z,mask)
+
+        self.assertEqual(gamma.shape,(11,15))
+        self.assertEqual(nums[5,7],mask.sum()-1)
+
+        y,x = np.meshgrid(np.arange(6)*20.,np.arange(8)*10.,indexing='ij')
+
+        active = np.logical_and(mask,np.isfinite(z))
+
+        data = Spatial(z[active],x[active],y[active])
+
+        for exp in (
+            Experimental(lagdist=10,lagtol=5,outbound=70),
+            Experimental(lagdist=20,lagtol=10,outbound=80,azimuth=90,azimtol=10),
+            ):
+
+            ggrid,hbins = GridVariogram.directional(gamma,nums,(20.,10.),exp)
+
+            np.testing.assert_allclose(ggrid,Variogram.experimental(data,exp)[0])
+
+    def test_realizations(self):
+
+        rng = np.random.default_rng(5)
+
+        z = rng.normal(size=(3,4,5,6))
+
+        gamma,nums = GridVariogram.lagmap(z,ndim=3)
+
+        self.assertEqual(gamma.shape,(3,7,9,11))
+
+        for real in range(3):
+            np.testing.assert_allclose(gamma[real],GridVariogram.lagmap(z[real])[0])
+
+        exp = Experimental(lagdist=1,lagtol=0.5,outbound=4)
+
+        gdir,_ = GridVariogram.directional(gamma,nums,(1.,1.,1.),exp)
+
+        self.assertEqual(gdir.shape,(3,4))
+
+        np.testing.assert_allclose(gdir[1],GridVariogram.directional(gamma[1],nums[1],(1.,1.,1.),exp)[0])
+
+if __name__ == "__main__":
+    unittest.main()
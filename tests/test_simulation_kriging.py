@@ -0,0 +1,389 @@
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from gmodel.continuity import Theoretical
+
+from gmodel.simulation.kriging._cache import Cache
+from gmodel.simulation.kriging._neighborhood import Neighborhood
+from gmodel.simulation.kriging._ordinary import Ordinary
+from gmodel.simulation.kriging._simple import Simple
+
+from gmodel.utils import Spatial
+
+def scattered():
+    """Returns 150 scattered observations, a 21x17 target grid and a variogram."""
+
+    generator = np.random.default_rng(11)
+
+    x,y = generator.uniform(0,1000,(2,150))
+
+    obs = Spatial(np.sin(x/150.)+np.cos(y/200.),x,y)
+
+    gx,gy = np.meshgrid(np.linspace(0,1000,21),np.linspace(0,1000,17))
+
+    return obs,Spatial(None,gx.ravel(),gy.ravel()),Theoretical("spherical",sill=1.,radius=400.,nugget=0.05)
+
+class TestOrdinary(unittest.TestCase):
+
+    def setUp(self):
+
+        # Example 4.2 page 187, Peters Volume 1
+        self.obs = Spatial(np.array([30.,50.,20.]),np.array([2.,4.,6.]))
+        self.est = Spatial(None,np.array([1.,2.,3.,4.,5.,6.,7.,8.]))
+
+        self.var = Theoretical("exponential",sill=100.,radius=10.)
+
+        self.expected = np.array([29.897,30.000,39.549,50.000,34.766,20.000,22.489,24.332])
+
+    def test_exercise_peters(self):
+
+        est,var = Ordinary(self.obs,self.var).estimate(self.est)
+
+        np.testing.assert_array_almost_equal(est,self.expected,decimal=3)
+
+        np.testing.assert_allclose(var[[1,3,5]],0.,atol=1e-9)
+
+    def test_shared_factorization(self):
+
+        Ordinary.cache.clear()
+
+        krig = Ordinary(self.obs,self.var)
+
+        props = np.column_stack([self.obs.prop,2*self.obs.prop+1])
+
+        est,err = krig.estimate(self.est,props)
+
+        self.assertEqual(est.shape,(2,8))
+
+        np.testing.assert_allclose(est[0],krig.estimate(self.est)[0])
+        np.testing.assert_allclose(est[1],2*est[0]+1)
+
+        bands = krig(self.est,frac=[0.1,0.5,0.9])
+
+        self.assertEqual(bands.shape,(3,8))
+
+        np.testing.assert_allclose(bands[1],est[0])
+        np.testing.assert_allclose(bands[2]-bands[1],bands[1]-bands[0])
+
+        self.assertEqual(Ordinary.cache.misses,1)
+
+        # weights sum to one
+        lamda,var = krig.weights(self.est)
+
+        np.testing.assert_allclose(lamda.sum(axis=0),1.)
+
+    def test_cache(self):
+
+        Ordinary.cache.clear()
+
+        Ordinary(self.obs,self.var).estimate(self.est)
+
+        other = Spatial(np.array([1.,2.,3.]),np.array([2.,4.,6.]))
+
+        Ordinary(other,self.var).estimate(self.est)
+
+        self.assertEqual(len(Ordinary.cache),1)
+        self.assertEqual(Ordinary.cache.hits,1)
+
+        Ordinary(self.obs,Theoretical("spherical",sill=100.,radius=10.)).estimate(self.est)
+
+        self.assertEqual(len(Ordinary.cache),2)
+
+    def test_parameter_batch(self):
+
+        var = Theoretical("spherical",sill=100.,radius=np.array([[3.],[7.],[11.]]),nugget=np.array([0.,10.,20.]))
+
+        self.assertEqual(var.shape,(3,3))
+
+        bins = np.linspace(0,15,31)
+
+        gamma = var(bins)
+
+        est,err = Ordinary(self.obs,var).estimate(self.est)
+
+        self.assertEqual(est.shape,(3,3,8))
+
+        for index in np.ndindex(3,3):
+
+            single = var.select(index)
+
+            np.testing.assert_allclose(gamma[index],single(bins))
+
+            sest,serr = Ordinary(self.obs,single).estimate(self.est)
+
+            np.testing.assert_allclose(est[index],sest)
+            np.testing.assert_allclose(err[index],serr)
+
+    def test_intrinsic_models(self):
+
+        obs = Spatial(np.array([30.,50.,20.,40.,35.]),np.array([2.,4.,6.,9.,13.]))
+
+        for var in (Theoretical("powermodel",sill=10.,power=1.5),Theoretical("dewijs",sill=10.)):
+
+            est,err = Ordinary(obs,var).estimate(self.est)
+
+            # reference solve of the bordered system in semivariances
+            size = obs.size
+
+            lhs = np.ones((size+1,size+1))
+            lhs[:size,:size] = var(obs.get_distmat(obs))
+            lhs[size,size] = 0
+
+            rhs = np.ones((size+1,self.est.size))
+            rhs[:size] = var(self.est.get_distmat(obs)).T
+
+            sol = np.linalg.solve(lhs,rhs)
+
+            np.testing.assert_allclose(est,obs.prop@sol[:size])
+            np.testing.assert_allclose(err,(sol*rhs).sum(axis=0),atol=1e-9)
+
+            np.testing.assert_allclose(est[[1,3,5]],[30.,50.,20.])
+
+    def test_covariance_in_place(self):
+
+        generator = np.random.default_rng(5)
+
+        obs = Spatial(generator.normal(size=1500),*generator.uniform(0,1000,(2,1500)))
+
+        var = Theoretical("spherical",sill=1.,radius=400.,nugget=0.05)
+
+        krig = Ordinary(obs,var)
+
+        tracemalloc.start()
+
+        cmat = krig._covmat()
+
+        peak = tracemalloc.get_traced_memory()[1]
+
+        tracemalloc.stop()
+
+        # the distance matrix is overwritten by the covariances
+        self.assertLess(peak,1.2*cmat.nbytes)
+
+        np.testing.assert_allclose(cmat,var.sill-var(obs.get_distmat(obs)))
+
+    def test_cache_eviction(self):
+
+        cache = Cache(memory=1.5)
+
+        for index in range(4):
+            cache.get(index,lambda: np.zeros(2**17))
+
+        self.assertEqual(len(cache),1)
+        self.assertIn(3,cache)
+
+        self.assertFalse(cache.get(3,None).flags.writeable)
+
+        self.assertLessEqual(cache.nbytes,1.5*2**20)
+
+class TestSimple(unittest.TestCase):
+
+    def setUp(self):
+
+        generator = np.random.default_rng(13)
+
+        x,y = generator.uniform(0,1000,(2,120))
+
+        self.obs = Spatial(np.sin(x/150.)+np.cos(y/200.)+3.,x,y)
+
+        self.est = Spatial(None,*generator.uniform(0,1000,(2,300)))
+
+        self.var = Theoretical("exponential",sill=1.,radius=400.,nugget=0.05)
+
+    def reference(self,mean,tmean):
+        """Simple kriging by a dense solve of the covariance system."""
+
+        cmat = self.var.sill-self.var(self.obs.distmat)
+        crhs = self.var.sill-self.var(self.est.get_distmat(self.obs)).T
+
+        lamda = np.linalg.solve(cmat,crhs)
+
+        est = tmean+lamda.T@(self.obs.prop-mean)
+        var = self.var.sill-(lamda*crhs).sum(axis=0)
+
+        return est,var
+
+    def test_scalar_mean(self):
+
+        krig = Simple(self.obs,self.var,mean=3.)
+
+        est,var = krig.estimate(self.est)
+
+        rest,rvar = self.reference(3.,3.)
+
+        np.testing.assert_allclose(est,rest)
+        np.testing.assert_allclose(var,rvar)
+
+        self.assertAlmostEqual(Simple(self.obs,self.var).mean,self.obs.prop.mean())
+
+        np.testing.assert_allclose(krig(self.est,frac=0.5),rest)
+
+    def test_varying_mean(self):
+
+        mean = 3.+self.obs.xaxis/1000.
+        tmean = 3.+self.est.xaxis/1000.
+
+        krig = Simple(self.obs,self.var,mean=mean)
+
+        with self.assertRaises(ValueError):
+            krig.estimate(self.est)
+
+        est,var = krig.estimate(self.est,mean=tmean,memory=0.05)
+
+        rest,rvar = self.reference(mean,tmean)
+
+        np.testing.assert_allclose(est,rest)
+        np.testing.assert_allclose(var,rvar)
+
+        pest,pvar = krig.estimate(self.est,mean=tmean,workers=2)
+
+        np.testing.assert_allclose(pest,rest)
+        np.testing.assert_allclose(pvar,rvar)
+
+    def test_local_limit(self):
+
+        krig = Simple(self.obs,self.var,mean=3.)
+
+        est,var = krig.local(self.est,Neighborhood(maxcount=120),blocksize=64)
+
+        rest,rvar = self.reference(3.,3.)
+
+        np.testing.assert_allclose(est,rest,atol=1e-8)
+        np.testing.assert_allclose(var,rvar,atol=1e-8)
+
+class TestGlobalBlocks(unittest.TestCase):
+
+    def setUp(self):
+
+        self.obs,self.est,self.var = scattered()
+
+    def test_chunked_targets(self):
+
+        krig = Ordinary(self.obs,self.var)
+
+        self.assertEqual(krig.chunksize(memory=48*150/2**20*7),7)
+
+        est,err = krig.estimate(self.est)
+
+        cest,cerr = krig.estimate(self.est,memory=48*150/2**20*7)
+
+        np.testing.assert_allclose(cest,est)
+        np.testing.assert_allclose(cerr,err)
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            out = tuple(np.lib.format.open_memmap(os.path.join(folder,f"{name}.npy"),mode="w+",shape=(self.est.size,))
+                for name in ("estimate","variance"))
+
+            result = krig.estimate(self.est,memory=0.01,out=out)
+
+            self.assertIs(result[0],out[0])
+
+            np.testing.assert_allclose(out[0],est)
+            np.testing.assert_allclose(out[1],err)
+
+            del out,result
+
+    def test_parallel_blocks(self):
+
+        krig = Ordinary(self.obs,self.var)
+
+        est,err = krig.estimate(self.est)
+
+        pest,perr = krig.estimate(self.est,workers=2)
+
+        np.testing.assert_allclose(pest,est)
+        np.testing.assert_allclose(perr,err)
+
+        bands = krig(self.est,frac=[0.1,0.9],memory=0.05,workers=3)
+
+        np.testing.assert_allclose(bands,krig(self.est,frac=[0.1,0.9]))
+
+        # the workers open memmap outputs by filename and write their blocks
+        with tempfile.TemporaryDirectory() as folder:
+
+            out = tuple(np.lib.format.open_memmap(os.path.join(folder,f"{name}.npy"),mode="w+",shape=(self.est.size,))
+                for name in ("estimate","variance"))
+
+            krig.estimate(self.est,out=out,workers=2)
+
+            np.testing.assert_allclose(np.load(os.path.join(folder,"estimate.npy")),est)
+            np.testing.assert_allclose(out[1],err)
+
+            del out
+
+class TestNeighborhood(unittest.TestCase):
+
+    def setUp(self):
+
+        self.obs,self.est,self.var = scattered()
+
+    def test_global_limit(self):
+
+        krig = Ordinary(self.obs,self.var)
+
+        est,err = krig.local(self.est,Neighborhood(maxcount=150),blocksize=50)
+
+        gest,gerr = krig.estimate(self.est)
+
+        np.testing.assert_allclose(est,gest,atol=1e-8)
+        np.testing.assert_allclose(err,gerr,atol=1e-8)
+
+    def test_search(self):
+
+        search = Neighborhood(radius=300.,minor=100.,azimuth=30.,maxcount=12,octant=2)
+
+        index,counts = search.search(self.obs.points,self.est.points)
+
+        self.assertEqual(index.shape,(self.est.size,12))
+
+        angle = np.radians(30.)
+
+        for row in range(self.est.size):
+
+            neighbors = index[row,:counts[row]]
+
+            self.assertTrue(np.all(index[row,counts[row]:]==-1))
+
+            offset = self.obs.points[neighbors]-self.est.points[row]
+
+            along = offset@[np.cos(angle),np.sin(angle)]
+            across = offset@[-np.sin(angle),np.cos(angle)]
+
+            self.assertTrue(np.all((along/300.)**2+(across/100.)**2<=1+1e-12))
+
+            quadrant = (along>=0)+2*(across>=0)
+
+            self.assertTrue(np.all(np.bincount(quadrant,minlength=4)<=2))
+
+    def test_local_estimates(self):
+
+        krig = Ordinary(self.obs,self.var)
+
+        search = Neighborhood(radius=250.,maxcount=10,mincount=4)
+
+        est,err = krig.local(self.est,search)
+
+        index,counts = search.search(self.obs.points,self.est.points)
+
+        self.assertTrue(np.all(np.isnan(est[counts<4])))
+
+        for row in np.nonzero(counts>=4)[0][::23]:
+
+            neighbors = index[row,:counts[row]]
+
+            sub = Spatial(self.obs.prop[neighbors],*self.obs.points[neighbors].T)
+
+            target = Spatial(None,*self.est.points[row:row+1].T)
+
+            sest,serr = Ordinary(sub,self.var).estimate(target)
+
+            self.assertAlmostEqual(est[row],sest[0])
+            self.assertAlmostEqual(err[row],serr[0])
+
+if __name__ == "__main__":
+    unittest.main()
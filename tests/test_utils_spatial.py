@@ -0,0 +1,139 @@
+import os
+import unittest
+
+import numpy as np
+
+from gmodel.utils import Spatial
+
+class TestSpatial(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(17)
+
+        self.x,self.y,self.z = rng.uniform(0,100,(3,40))
+
+        self.prop = rng.normal(size=40)
+
+        self.data = Spatial(self.prop,self.x,self.y,self.z)
+
+    def test_condensed_pairs(self):
+
+        size = self.data.size
+
+        self.assertEqual(self.data.distvec.size,size*(size-1)//2)
+
+        first,second = self.data.unravel(np.arange(self.data.distvec.size))
+
+        np.testing.assert_array_equal((first,second),np.triu_indices(size,1))
+
+        np.testing.assert_allclose(self.data.xdeltavec,self.x[second]-self.x[first])
+        np.testing.assert_allclose(self.data.deltavec,self.prop[second]-self.prop[first])
+
+    def test_square_views(self):
+
+        xdelta = self.x-self.x.reshape((-1,1))
+        ydelta = self.y-self.y.reshape((-1,1))
+        zdelta = self.z-self.z.reshape((-1,1))
+
+        np.testing.assert_allclose(self.data.xdelta,xdelta)
+        np.testing.assert_allclose(self.data.zdelta,zdelta)
+        np.testing.assert_allclose(self.data.delta,self.prop-self.prop.reshape((-1,1)))
+        np.testing.assert_allclose(self.data.distmat,np.sqrt(xdelta**2+ydelta**2+zdelta**2))
+
+        azimmat = np.arctan2(ydelta,xdelta)
+        offdiag = ~np.eye(self.data.size,dtype=bool)
+
+        np.testing.assert_allclose(self.data.azimmat[offdiag],azimmat[offdiag])
+
+    def test_single_precision(self):
+
+        data = Spatial(self.prop,self.x,self.y,dtype=np.float32)
+
+        self.assertEqual(data.distvec.dtype,np.float32)
+        self.assertEqual(data.distmat.dtype,np.float32)
+
+        np.testing.assert_allclose(data.distvec,Spatial(self.prop,self.x,self.y).distvec,rtol=1e-6)
+
+    def test_invalidation(self):
+
+        distvec = self.data.distvec
+        deltavec = self.data.deltavec
+        xdeltavec = self.data.xdeltavec
+
+        self.data.xaxis = self.x*2
+
+        self.assertIsNot(self.data.distvec,distvec)
+        np.testing.assert_allclose(self.data.xdeltavec,2*xdeltavec)
+        np.testing.assert_array_equal(self.data.deltavec,deltavec)
+
+        self.data.prop = self.prop*3
+
+        np.testing.assert_allclose(self.data.deltavec,3*deltavec)
+
+        np.testing.assert_allclose(self.data.bbox[1],[self.x.max()*2,self.y.max(),self.z.max()])
+
+        # in-place edits would bypass the invalidating setters
+        for view in (self.data.xaxis,self.data.prop,self.data.props,self.data.points):
+            with self.assertRaises(ValueError):
+                view[0] = 10.
+
+        xaxis = self.data.xaxis.copy()
+        xaxis[0] = 10.
+
+        self.data.xaxis = xaxis
+
+        np.testing.assert_allclose(self.data.bbox[0][0],min(10.,xaxis.min()))
+        np.testing.assert_allclose(self.data.distvec[:self.data.size-1],
+            np.sqrt(((self.data.points[1:]-self.data.points[0])**2).sum(axis=1)))
+
+    def test_columns(self):
+
+        data = Spatial(np.column_stack((self.prop,2*self.prop)),self.x,names=("a","b"))
+
+        self.assertIsNone(data.yaxis)
+        self.assertEqual(data.props.shape,(40,2))
+
+        first = data.deltavec
+
+        data.select("b")
+
+        np.testing.assert_allclose(data.deltavec,2*first)
+
+        data.props = np.ones(40)
+
+        self.assertEqual(data.names,("prop0",))
+        np.testing.assert_array_equal(data.prop,np.ones(40))
+        np.testing.assert_array_equal(data.deltavec,np.zeros(first.size))
+
+        with self.assertRaises(ValueError):
+            Spatial(np.column_stack((self.prop,2*self.prop)),self.x,names=("a",))
+
+    def test_read_table(self):
+
+        path = os.path.join(os.path.dirname(__file__),os.pardir,"docs","gstats_2D_data_7.txt")
+
+        data = Spatial.read(path,"X","Y",props=("porosity","permeability"))
+
+        self.assertEqual(data.names,("porosity","permeability"))
+        self.assertEqual(data.props.shape,(data.size,2))
+
+        np.testing.assert_allclose(data.points[0],[565,1485])
+        np.testing.assert_allclose(data.props[0],[0.1184,6.17])
+
+        table = Spatial.read(os.path.join(os.path.dirname(__file__),os.pardir,"docs","gstats_1D_data_4.txt"),"depth, ft")
+
+        self.assertEqual(table.names,("GR",))
+        self.assertAlmostEqual(table.prop[0],38.58)
+
+    def test_cross_distances(self):
+
+        other = Spatial(None,[0.,1.],[0.,0.],[0.,0.])
+
+        distmat = other.get_distmat(self.data)
+
+        self.assertEqual(distmat.shape,(2,40))
+        np.testing.assert_allclose(distmat[0],np.sqrt(self.x**2+self.y**2+self.z**2))
+
+if __name__ == "__main__":
+    unittest.main()